@@ -19,27 +19,38 @@ from __future__ import annotations
 
 import csv
 import getpass
+import io
 import json
 import logging
 import os
 import re
-import shutil
-import subprocess
-import tempfile
 import sys
-from datetime import datetime
+import uuid
+import weakref
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP, getcontext
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Iterable, Match, Iterator
+from typing import Dict, List, Optional, Set, Tuple, Iterable, Match, Iterator, Union
 
+import pikepdf
+import pypdfium2 as pdfium
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader, PdfWriter
+from pdfminer.high_level import extract_text_to_fp
+from pdfminer.layout import LAParams
 
 # Decimal precision
 getcontext().prec = 28
 
+# Environment (.env is read once, before any os.getenv below)
+load_dotenv()
+
 # Logging
 LOG_FILE = os.path.abspath("phonepe_debug.log")
 root_logger = logging.getLogger()
@@ -75,13 +86,33 @@ INR_AMT_RE = re.compile(
     re.IGNORECASE,
 )
 AMOUNT_RE = re.compile(r'([0-9]{1,3}(?:,[0-9]{3})*(?:\.[0-9]+)|\d+(?:\.[0-9]+)?)')
+# A currency-prefixed amount: what marks a leftover line as a transaction line.
+# (AMOUNT_RE alone also fires on page numbers and other stray digits.)
+_STRAY_LINE_RE = re.compile(r'(?:INR|₹|Rs\.?)\s*[0-9,]', re.IGNORECASE)
 
 TXN_ID_RE = re.compile(r'Transaction\s*ID\s*[:\-\s]*([A-Za-z0-9]+)', re.IGNORECASE)
+# Bare "T2510...": a transaction id without its "Transaction ID" label
+UNLABELLED_TXN_ID_RE = re.compile(r"\b([A-Z]{1,4}\d{5,}[A-Za-z0-9]*)\b")
 # UTR_RE = re.compile(r'UTR\s*No\s*[:\-\s]*([A-Za-z0-9]+)', re.IGNORECASE)
 UTR_RE = re.compile(r'UTR\s*No\.?\s*[:\-\s]*([A-Za-z0-9]+)', re.IGNORECASE)
-DEBIT_WORD_RE = re.compile(r'\bDebit\b', re.IGNORECASE)
-CREDIT_WORD_RE = re.compile(r'\bCredit\b', re.IGNORECASE)
-HEADER_KEYWORDS = ["date transaction details", "transaction details", "date transaction details type amount"]
+PAID_TO_RE = re.compile(
+    r"(Paid to|Received from|Bill paid -|Bill paid)\s*(.+?)(?=(Transaction ID|UTR|INR|Debit|Credit|$))",
+    re.IGNORECASE,
+)
+SPLIT_FIELDS_RE = re.compile(r"Transaction\s*ID|UTR|INR|Debited\s*from|Credited\s*to|Debit|Credit", re.IGNORECASE)
+# Segment fields for parse_text_for_records; payee stops at the end of its line
+SEGMENT_PAYEE_RE = re.compile(r'(?:Bill|Paid|Add|Received)\s*(?:paid|to|money|from)\s*[:\-\s]*([A-Za-z0-9 &]+)', re.IGNORECASE)
+SEGMENT_PAYER_RE = re.compile(r'(?:Paid\s*by|Debited\s*from|Credited\s*to)\s*([Xx0-9A-Za-z\-\+]+)', re.IGNORECASE)
+# Debit/Credit words in one pass; a block mentioning both is still a Debit
+DEBIT_CREDIT_WORD_RE = re.compile(r'\b(Debit|Credit)\b', re.IGNORECASE)
+# INR_AMT_RE and DEBIT_CREDIT_WORD_RE as one alternation, so _parse_one_block scans a block once
+# for both; m.lastgroup names the field each match belongs to. TXN_ID_RE and UTR_RE stay separate
+# searches: in one alternation a "Transaction ID" with no value would take "UTR" as its value.
+BLOCK_FIELDS_RE = re.compile(
+    r'(?:INR|₹|Rs\.?)\s*(?P<inr>[0-9,]+(?:\.[0-9]+)?)'
+    r'|\b(?P<type_word>Debit|Credit)\b',
+    re.IGNORECASE,
+)
 # Header/header-context phrases to detect first-page header blocks
 PAGE_HEADER_MARKERS = [
     r"transaction\s+statement\s+for",   # "Transaction Statement for +91..."
@@ -89,10 +120,33 @@ PAGE_HEADER_MARKERS = [
     r"date\s*$",                       # a lone "Date" line
 ]
 PAGE_HEADER_MARKERS_RE = re.compile("|".join(PAGE_HEADER_MARKERS), re.IGNORECASE)
+# Lines that are nothing but a column header
+LONE_HEADER_TOKENS = frozenset(("date", "transaction details", "date transaction details"))
+
 
+# parse_pdf2txt_lines fans block parsing out to worker processes from this many blocks;
+# below it the process start-up costs more than it saves
+PARALLEL_PARSE_MIN_BLOCKS = 2000
+
+# insert_transactions buffers expense rows and writes them with execute_values in batches of
+# this size (one commit per batch); transfers are queued and written the same way.
+# Per-row logs go to DEBUG; INFO gets one progress line per batch
+EXPENSE_BATCH_SIZE = 1000
 
 DEFAULT_SELF_ACCOUNT_ID = os.getenv("SURE_SELF_ACCOUNT_ID", "54f3d108-9ed2-446c-a489-ed1c2ffdf5b0")
 
+# DB configuration (SURE_* takes precedence over the generic DB_* names)
+DB_HOST = os.getenv("SURE_DB_HOST") or os.getenv("DB_HOST") or "localhost"
+DB_PORT = int(os.getenv("SURE_DB_PORT") or os.getenv("DB_PORT") or 5432)
+DB_NAME = os.getenv("SURE_DB_NAME") or os.getenv("DB_NAME")
+DB_USER = os.getenv("SURE_DB_USER") or os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("SURE_DB_PASSWORD") or os.getenv("DB_PASSWORD")
+
+# Statements longer than INSERT_CHUNK_SIZE records are split into chunks inserted in parallel,
+# each on its own pooled connection; at most DB_WORKERS connections (1 disables this)
+DB_WORKERS = int(os.getenv("SURE_DB_WORKERS") or 4)
+INSERT_CHUNK_SIZE = 500
+
 
 #
 # Standalone Date Iterator
@@ -110,6 +164,20 @@ DATE_RANGE_RE = re.compile(
 # Candidate single-date regex (no lookarounds here)
 DATE_RE = re.compile(rf"(?P<date>{DATE_PAT})", flags=re.IGNORECASE)
 
+# Field patterns for parse_text_for_tx (compiled once at import, not per statement)
+TX_TIME_RE   = re.compile(r'(?P<time>\d{1,2}:\d{2}\s*(?:AM|PM))\s+', re.IGNORECASE)
+TX_PAYEE_RE  = re.compile(
+    r'(?:Bill|Paid|Add|Received)\s*(?:paid|to|money|from)\s*[:\-\s]*'
+    r'(?P<name>[A-Za-z0-9&.,\-\s\*]+?)'
+    r'(?=\s*(?:Transaction\s*ID|DEBIT|CREDIT|INR|\n\s*\n))',
+    re.IGNORECASE
+)
+TX_TYPE_RE   = re.compile(r'(?P<type>DEBIT|CREDIT)\s+', re.IGNORECASE)
+TX_AMOUNT_RE = re.compile(r'(?:INR|₹|Rs\.?)\s*(?P<amount>[0-9,]+(?:\.[0-9]+)?)', re.IGNORECASE)
+TX_TXID_RE   = re.compile(r'Transaction\s*ID\s*[:\-\s]*(?P<transaction_id>[A-Za-z0-9\-]+)', re.IGNORECASE)
+TX_UTR_RE    = re.compile(r'UTR\s*No\.?\s*[:\-\s]*(?P<utr_no>[A-Za-z0-9\-]+)', re.IGNORECASE)
+TX_PAYER_RE  = re.compile(r'(?:Paid by|Debited from|Credited to)\s*(?P<payer>([0-9X\-\+]+|UPI Lite|Wallet))', re.IGNORECASE)
+
 def standalone_date_iter(text: str) -> Iterator[Match]:
     """
     Yield only those DATE_RE matches that are NOT part of a date-range.
@@ -135,58 +203,98 @@ def standalone_date_iter(text: str) -> Iterator[Match]:
 # ----------------------
 # Utilities & parsing
 # ----------------------
-def find_pdf2txt_cmd() -> Optional[str]:
-    for name in ("pdf2txt.py", "pdf2txt"):
-        p = shutil.which(name)
-        if p:
-            return p
-    return None
+def extract_pdf_lines(pdf: Union[Path, bytes]) -> List[str]:
+    """Extract the text of *pdf* (a path or the PDF bytes) in-process (same layout as `pdf2txt.py`)."""
+    buf = io.StringIO()
+    with (io.BytesIO(pdf) if isinstance(pdf, bytes) else open(pdf, "rb")) as fh:
+        extract_text_to_fp(fh, buf, laparams=LAParams())
+    return buf.getvalue().splitlines()
 
 
-def run_pdf2txt(pdf_path: Path, out_txt: Path) -> Path:
-    cmd = find_pdf2txt_cmd()
-    if not cmd:
-        raise RuntimeError("pdf2txt utility not found in PATH. Install pdfminer.six.")
+def decrypt_pdf_if_needed(pdf_path: Path) -> bytes:
+    """
+    The PDF at *pdf_path* as bytes, decrypted when it is encrypted. The file is read once;
+    the page-1 and full-text readers both work from the returned bytes.
+    """
+    raw = pdf_path.read_bytes()
     try:
-        subprocess.check_call([cmd, "-o", str(out_txt), str(pdf_path)])
-    except Exception:
-        with open(out_txt, "wb") as fh:
-            subprocess.check_call([cmd, str(pdf_path)], stdout=fh)
-    return out_txt
+        pdf = pikepdf.open(io.BytesIO(raw))
+    except pikepdf.PasswordError:
+        pdf = None
+        for _ in range(3):
+            pwd = getpass.getpass("PDF is encrypted. Enter password: ")
+            try:
+                pdf = pikepdf.open(io.BytesIO(raw), password=pwd)
+                break
+            except pikepdf.PasswordError:
+                continue
+            except Exception:
+                logger.exception("PDF decrypt attempt failed")
+        if pdf is None:
+            raise RuntimeError("Failed to decrypt PDF after 3 attempts")
+    with pdf:
+        if not pdf.is_encrypted:
+            return raw
+        # qpdf writes the unencrypted copy in a single native pass; kept in memory so
+        # no decrypted statement is left behind on disk
+        out = io.BytesIO()
+        pdf.save(out)
+        return out.getvalue()
+
+
+# normalize_date helpers
+_DATE_COMMA_RE = re.compile(r",\s*(?=\d{4})")
+_DIGITS_RE = re.compile(r"\d+")
+# English month names and abbreviations -> month number (what %B/%b accept in the C locale)
+_MONTH_NAMES = (
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+)
+_MONTHS = {name: i for i, name in enumerate(_MONTH_NAMES, 1)}
+_MONTHS.update({name[:3]: i for i, name in enumerate(_MONTH_NAMES, 1)})
+# (shape, field order) pairs; the first shape that fully matches is the only one tried,
+# and its groups are turned into a date directly (no strptime format parsing per call)
+_DATE_SHAPES = [
+    (re.compile(r"([A-Za-z]{3,9})\s+(\d{1,2}),\s+(\d{4})"), "mdy"),
+    (re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})"), "ymd"),
+    (re.compile(r"(\d{1,2})-(\d{1,2})-(\d{4})"), "dmy"),
+    (re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})"), "dmy"),
+]
+# normalize_time/statement_datetime helpers: "%I:%M %p" and "%H:%M"
+_TIME_12H_RE = re.compile(r"(\d{1,2}):(\d{1,2})\s+([AP]M)", re.IGNORECASE)
+_TIME_24H_RE = re.compile(r"(\d{1,2}):(\d{1,2})")
+_MONTH_DAY_YEAR_RE = re.compile(r"([A-Za-z]{3})\s+(\d{1,2}),\s+(\d{4})")
 
 
-def decrypt_pdf_if_needed(pdf_path: Path) -> Path:
-    reader = PdfReader(str(pdf_path))
-    if not getattr(reader, "is_encrypted", False):
-        return pdf_path
-    for _ in range(3):
-        pwd = getpass.getpass("PDF is encrypted. Enter password: ")
-        try:
-            if reader.decrypt(pwd):
-                tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-                writer = PdfWriter()
-                for p in reader.pages:
-                    writer.add_page(p)
-                with open(tmp.name, "wb") as fh:
-                    writer.write(fh)
-                return Path(tmp.name)
-        except Exception:
-            logger.exception("PDF decrypt attempt failed")
-    raise RuntimeError("Failed to decrypt PDF after 3 attempts")
+def _hour_minute_12h(m: Match) -> Optional[Tuple[int, int]]:
+    """(hour, minute) on the 24h clock for a _TIME_12H_RE match, None if out of range."""
+    hour, minute = int(m.group(1)), int(m.group(2))
+    if not (1 <= hour <= 12 and minute < 60):
+        return None
+    return hour % 12 + (12 if m.group(3).upper() == "PM" else 0), minute
 
 
+# statements repeat the same few dates and times, so both normalizers are memoized
+@lru_cache(maxsize=4096)
 def normalize_date(dstr: str) -> str:
     if not dstr:
         return ""
     s = dstr.replace("\u00A0", " ").strip()
-    s = re.sub(r",\s*(?=\d{4})", ", ", s)
-    fmts = ["%b %d, %Y", "%B %d, %Y", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y"]
-    for f in fmts:
-        try:
-            return datetime.strptime(s, f).strftime("%Y-%m-%d")
-        except Exception:
-            pass
-    nums = re.findall(r"\d+", s)
+    s = _DATE_COMMA_RE.sub(", ", s)
+    for shape, order in _DATE_SHAPES:
+        m = shape.fullmatch(s)
+        if m:
+            a, b, c = m.groups()
+            try:
+                if order == "mdy":
+                    return date(int(c), _MONTHS.get(a.lower(), 0), int(b)).isoformat()
+                if order == "ymd":
+                    return date(int(a), int(b), int(c)).isoformat()
+                return date(int(c), int(b), int(a)).isoformat()
+            except ValueError:
+                pass
+            break
+    nums = _DIGITS_RE.findall(s)
     if len(nums) >= 3:
         if len(nums[0]) == 4:
             y, m, d = nums[:3]
@@ -199,18 +307,51 @@ def normalize_date(dstr: str) -> str:
     return s
 
 
+@lru_cache(maxsize=4096)
 def normalize_time(tstr: str) -> str:
     if not tstr:
         return ""
     t = tstr.strip().upper()
-    for fmt in ("%I:%M %p", "%H:%M"):
-        try:
-            return datetime.strptime(t, fmt).strftime("%H:%M")
-        except Exception:
-            pass
+    m = _TIME_12H_RE.fullmatch(t)
+    if m:
+        hm = _hour_minute_12h(m)
+        if hm:
+            return f"{hm[0]:02d}:{hm[1]:02d}"
+        return t
+    m = _TIME_24H_RE.fullmatch(t)
+    if m:
+        hour, minute = int(m.group(1)), int(m.group(2))
+        if hour < 24 and minute < 60:
+            return f"{hour:02d}:{minute:02d}"
     return t
 
 
+def statement_datetime(date_s: str, time_s: str) -> datetime:
+    """
+    datetime for a parse_text_for_tx date/time pair. The usual "Oct 05, 2025" + "10:15 AM" form
+    is built directly; anything else goes through the strptime formats the statements use.
+    Raises ValueError for a pair in none of them.
+    """
+    md = _MONTH_DAY_YEAR_RE.fullmatch(date_s)
+    mt = _TIME_12H_RE.fullmatch(time_s)
+    if md and mt:
+        month = _MONTHS.get(md.group(1).lower())
+        hm = _hour_minute_12h(mt)
+        if month and hm:
+            try:
+                return datetime(int(md.group(3)), month, int(md.group(2)), hm[0], hm[1])
+            except ValueError:
+                pass
+    raw_dt = f"{date_s} {time_s}"
+    try:
+        return datetime.strptime(raw_dt, "%b %d, %Y %I:%M %p")
+    except ValueError:
+        try:
+            return datetime.strptime(raw_dt, "%d/%m/%Y %I:%M %p")
+        except ValueError:
+            return datetime.strptime(raw_dt, "%Y-%m-%d %I:%M %p")
+
+
 def safe_decimal(s) -> Optional[Decimal]:
     if s is None or str(s).strip() == "":
         return None
@@ -231,51 +372,20 @@ def safe_decimal(s) -> Optional[Decimal]:
 def parse_text_for_tx(lines: List[str]) -> List[Dict]:
     text = "\n".join(lines)
 
-    # ---------------- REGEX PATTERNS ---------------- #
-    date_re = re.compile(
-        r'(?P<date>'
-        r'(?:[A-Za-z]{3,9}\s*\d{1,2},\s*\d{4}'   # Nov 06, 2025
-        r'|\d{1,2}[-/]\d{1,2}[-/]\d{2,4}'        # 06/11/2025
-        r'|\d{4}-\d{1,2}-\d{1,2})'               # 2025-11-06
-        r')\s+',
-        re.IGNORECASE
-    )
-
-    time_re   = re.compile(r'(?P<time>\d{1,2}:\d{2}\s*(?:AM|PM))\s+', re.IGNORECASE)
-    # payee_re  = re.compile(r'(?P<payee>[A-Za-z0-9\s&\.\-]+)(?=\s*(?:DEBIT|CREDIT|INR|₹))', re.IGNORECASE)
-    payee_re = re.compile(
-    r'(?:Bill|Paid|Add|Received)\s*(?:paid|to|money|from)\s*[:\-\s]*'
-    r'(?P<name>[A-Za-z0-9&.,\-\s\*]+?)'
-    r'(?=\s*(?:Transaction\s*ID|DEBIT|CREDIT|INR|\n\s*\n))',
-    re.IGNORECASE
-)
-    type_re   = re.compile(r'(?P<type>DEBIT|CREDIT)\s+', re.IGNORECASE)
-    amount_re = re.compile(r'(?:INR|₹|Rs\.?)\s*(?P<amount>[0-9,]+(?:\.[0-9]+)?)', re.IGNORECASE)
-    txid_re   = re.compile(r'Transaction\s*ID\s*[:\-\s]*(?P<transaction_id>[A-Za-z0-9\-]+)', re.IGNORECASE)
-    utr_re    = re.compile(r'UTR\s*No\.?\s*[:\-\s]*(?P<utr_no>[A-Za-z0-9\-]+)', re.IGNORECASE)
-    payer_re  = re.compile(r'(?:Paid by|Debited from|Credited to)\s*(?P<payer>([0-9X\-\+]+|UPI Lite|Wallet))', re.IGNORECASE)
-
-    # ---------------- EXTRACT DATA ---------------- #
-    date_list   = [m.groupdict() for m in standalone_date_iter(text)]
-    time_list   = [m.groupdict() for m in time_re.finditer(text)]
-    payee_list  = [m.groupdict() for m in payee_re.finditer(text)]
-    type_list   = [m.groupdict() for m in type_re.finditer(text)]
-    amount_list = [m.groupdict() for m in amount_re.finditer(text)]
-    txid_list   = [m.groupdict() for m in txid_re.finditer(text)]
-    utr_list    = [m.groupdict() for m in utr_re.finditer(text)]
-    payer_list  = [m.groupdict() for m in payer_re.finditer(text)]
+    # ---------------- EXTRACT DATA (one list per column) ---------------- #
+    columns = {
+        "date":           [m.group("date") for m in standalone_date_iter(text)],
+        "time":           [m.group("time") for m in TX_TIME_RE.finditer(text)],
+        "name":           [m.group("name") for m in TX_PAYEE_RE.finditer(text)],
+        "type":           [m.group("type") for m in TX_TYPE_RE.finditer(text)],
+        "amount":         [m.group("amount") for m in TX_AMOUNT_RE.finditer(text)],
+        "transaction_id": [m.group("transaction_id") for m in TX_TXID_RE.finditer(text)],
+        "utr_no":         [m.group("utr_no") for m in TX_UTR_RE.finditer(text)],
+        "payer":          [m.group("payer") for m in TX_PAYER_RE.finditer(text)],
+    }
 
     # ---------------- LENGTH VALIDATION ---------------- #
-    lengths = {
-        "date": len(date_list),
-        "time": len(time_list),
-        "name": len(payee_list),
-        "type": len(type_list),
-        "amount": len(amount_list),
-        "transaction_id": len(txid_list),
-        "utr_no": len(utr_list),
-        "payer": len(payer_list),
-    }
+    lengths = {k: len(v) for k, v in columns.items()}
 
     if len(set(lengths.values())) != 1:
         raise ValueError(
@@ -287,22 +397,13 @@ def parse_text_for_tx(lines: List[str]) -> List[Dict]:
     now_iso = datetime.now().isoformat()
     records = []
 
-    for group in zip(
-        date_list, time_list, payee_list, type_list,
-        amount_list, txid_list, utr_list, payer_list
-    ):
-        record = {k: v for d in group for k, v in d.items()}
+    # zip the columns row-wise; each record is the only dict built per transaction
+    keys = tuple(columns)
+    for values in zip(*columns.values()):
+        record = dict(zip(keys, values))
 
         # ✅ Parse date + time safely
-        raw_dt = f"{record['date']} {record['time']}"
-
-        try:
-            dt = datetime.strptime(raw_dt, "%b %d, %Y %I:%M %p")
-        except ValueError:
-            try:
-                dt = datetime.strptime(raw_dt, "%d/%m/%Y %I:%M %p")
-            except ValueError:
-                dt = datetime.strptime(raw_dt, "%Y-%m-%d %I:%M %p")
+        dt = statement_datetime(record['date'], record['time'])
 
         # ✅ Transform fields
         record["date"] = dt.date().isoformat()       # YYYY-MM-DD
@@ -375,62 +476,42 @@ def old_parse_text_for_tx(lines: List[str]) -> List[Dict]:
 
 def parse_text_for_records(lines: List[str]) -> List[Dict]:
     """
-    Replacement for original parse_text_for_records — fixes:
-      - use finditer() and m.groupdict() so matches are dicts keyed by named groups
-      - correct the amount named group syntax (?P<amount>...)
-      - keep the two-pattern fallback behavior unchanged
+    Anchor-and-slice parser: every DATE_FIND_RE hit starts a segment that runs to the next
+    hit, and each field is pulled out of its segment with a short, non-nested pattern.
+    Linear in the text size (the former DOTALL whole-document patterns could backtrack
+    for minutes on odd PDFs). Segments without time, transaction id, UTR, amount and
+    payer are skipped, as the old patterns required all of them.
     """
     text = '\n'.join(lines)
 
-    # Primary pattern: try a single-pass that captures many variants (named groups)
-    pattern = re.compile(
-        r'(?P<date>[A-Za-z]{3,9}\s*\d{1,2},\s*\d{4}|\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{4}-\d{1,2}-\d{1,2})\s+'
-        r'(?:(?:Paid|Add|Received)\s*(?:to|money|from)\s*[:\-\s]*(?P<payee>[A-Za-z0-9\s&]+)\s+)?'
-        r'(?:(?P<type>DEBIT|CREDIT)\s+)?'
-        r'(?:INR|₹|Rs\.?)\s*(?P<amount>[0-9,]+(?:\.[0-9]+)?)\s+'
-        r'(?P<time>\d{1,2}:\d{2}\s*(?:AM|PM))\s+'
-        r'Transaction\s*ID\s*[:\-\s]*(?P<txid>[A-Za-z0-9\-]+)\s+'
-        r'UTR\s*No\.?\s*[:\-\s]*(?P<utr>[A-Za-z0-9\-]+)\s+'
-        r'(?:Paid|Debited|Credited)\s*(?:by|from|to)\s*(?P<payer>[Xx0-9A-Za-z\-\+]+)\s*'
-        r'(?=(?:[A-Za-z]{3} \d{2}, \d{4}|Page|\Z))',
-        re.IGNORECASE | re.DOTALL
-    )
-
-    # Use finditer -> groupdict so match['date'] works
-    matches = [m.groupdict() for m in pattern.finditer(text)]
-
-    # If primary pattern finds nothing, use fallback pattern (older ordering)
-    if len(matches) == 0:
-        edge_pattern = re.compile(
-            r'(?P<date>[A-Za-z]{3,9}\s*\d{1,2},\s*\d{4}|\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{4}-\d{1,2}-\d{1,2})\s+'
-            r'(?P<time>\d{1,2}:\d{2}\s*(?:AM|PM))\s+'
-            r'(?:(?:Paid|Add|Received)\s*(?:to|money|from)\s*[:\-\s]*(?P<payee>[A-Za-z0-9\s&]+)\s+)?\s+'
-            r'Transaction\s*ID\s*[:\-\s]*(?P<txid>[A-Za-z0-9\-]+)\s+'
-            r"UTR\s*No\s*:\s*(?P<utr>\d+)\s*"
-            r'(?:Paid|Debited|Credited)\s*(?:by|from|to)\s*(?P<payer>[Xx0-9A-Za-z\-\+]+)\s*'
-            r"Type\s+Amount\s+"
-            r"(?P<type>Debit|Credit)\s*"
-            r"(?P<amount>INR\s*[0-9.,]+)",
-            re.DOTALL | re.IGNORECASE
-        )
-        edge_matches = [m.groupdict() for m in edge_pattern.finditer(text)]
-
-        fallback = re.compile(
-            r'(?P<date>[A-Za-z]{3,9}\s*\d{1,2},\s*\d{4}|\d{1,2}[-/]\d{1,2}[-/]\d{2,4}|\d{4}-\d{1,2}-\d{1,2})\s+'
-            r'(?P<time>\d{1,2}:\d{2}\s*(?:AM|PM))\s+'
-            r'(?:(?:Paid|Add|Received)\s*(?:to|money|from)\s*[:\-\s]*(?P<payee>[A-Za-z0-9\s&]+)\s+)?'
-            r'Transaction\s*ID\s*[:\-\s]*(?P<txid>[A-Za-z0-9\-]+)\s+'
-            r'(?:(?P<type>DEBIT|CREDIT)\s+)?'
-            r'(?:INR|₹|Rs\.?)\s*(?P<amount>[0-9,]+(?:\.[0-9]+)?)\s+'
-            r'UTR\s*No\.?\s*[:\-\s]*(?P<utr>[A-Za-z0-9\-]+)\s+'
-            r'(?:Paid|Debited|Credited)\s*(?:by|from|to)\s*(?P<payer>[Xx0-9A-Za-z\-\+]+)\s*'
-            r'(?=(?:[A-Za-z]{3} \d{2}, \d{4}|Page|\Z))',
-            re.IGNORECASE | re.DOTALL
-        )
-        fallback_matches = [m.groupdict() for m in fallback.finditer(text)]
-        matches = [*edge_matches]
-
-
+    anchors = list(DATE_FIND_RE.finditer(text))
+    ends = [m.start() for m in anchors[1:]] + [len(text)]
+
+    matches = []
+    for m_date, end in zip(anchors, ends):
+        segment = text[m_date.start():end]
+        m_time = TIME_FIND_RE.search(segment)
+        m_txid = TX_TXID_RE.search(segment)
+        m_utr = TX_UTR_RE.search(segment)
+        m_amount = INR_AMT_RE.search(segment)
+        m_payer = SEGMENT_PAYER_RE.search(segment)
+        if not (m_time and m_txid and m_utr and m_amount and m_payer):
+            continue
+        m_payee = SEGMENT_PAYEE_RE.search(segment)
+        m_type = DEBIT_CREDIT_WORD_RE.search(segment)
+        matches.append({
+            "date": m_date.group(1),
+            "time": m_time.group(1),
+            "payee": m_payee.group(1) if m_payee else None,
+            "type": m_type.group(1) if m_type else None,
+            "amount": m_amount.group(1),
+            "txid": m_txid.group("transaction_id"),
+            "utr": m_utr.group("utr_no"),
+            "payer": m_payer.group(1),
+        })
+
+    # one timestamp for the whole batch (updated_at, and created_at when the date is unusable)
+    now_str = datetime.now().isoformat(sep=" ", timespec="microseconds")
     records = []
     for match in matches:
         # defensive: match may be a dict with None values
@@ -449,11 +530,11 @@ def parse_text_for_records(lines: List[str]) -> List[Dict]:
 
         ts_time = time_norm or "00:00"
         try:
-            created_dt = datetime.strptime(f"{date_norm} {ts_time}", "%Y-%m-%d %H:%M")
-            created_at = created_dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+            created_dt = datetime.fromisoformat(f"{date_norm} {ts_time}")
+            created_at = created_dt.isoformat(sep=" ", timespec="microseconds")
         except Exception:
-            created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+            created_at = now_str
+        updated_at = now_str
 
         # amount normalization (keep as string like earlier code did; safe_decimal will later convert)
         amount_val = amount_raw.replace(",", "") if amount_raw else None
@@ -483,7 +564,7 @@ def parse_text_for_records(lines: List[str]) -> List[Dict]:
             "payer": payer_raw.split('\n')[0].strip() if payer_raw else None,
         }
 
-        logger.info(record)
+        logger.debug(record)
         records.append(record)
 
     return records
@@ -526,6 +607,8 @@ def old_parse_text_for_records(lines: List[str]) -> List[Dict]:
         # (date_index,time_index,name_index,tx_index,type_index,amount_index,utr_index,paidby_index) = range(8)
 
     records = []
+    # one timestamp for the whole statement (updated_at, and created_at when the date is unusable)
+    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
     for match in matches:
         # logger.info(match)
 
@@ -534,11 +617,11 @@ def old_parse_text_for_records(lines: List[str]) -> List[Dict]:
         time_norm = normalize_time(match['time'].strip())
         ts_time = time_norm or "00:00"
         try:
-            created_dt = datetime.strptime(f"{date_norm} {ts_time}", "%Y-%m-%d %H:%M")
+            created_dt = datetime.fromisoformat(f"{date_norm} {ts_time}")
             created_at = created_dt.strftime("%Y-%m-%d %H:%M:%S.%f")
         except Exception:
-            created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+            created_at = now_str
+        updated_at = now_str
 
         record = {
             "date": date_norm,
@@ -553,12 +636,178 @@ def old_parse_text_for_records(lines: List[str]) -> List[Dict]:
             "payer": match['payer'].split('\n')[0].strip(),
         }
 
-        logger.info(record)
+        logger.debug(record)
         records.append(record)
 
     return records
 
 
+def _parse_one_block(block: Tuple[Optional[str], str, str], now_str: Optional[str] = None) -> Optional[dict]:
+    """
+    Parse one (date_token, time_token, block_text) block from parse_pdf2txt_lines into a record.
+    The tokens come from the block's own lines; block_text is searched when they are empty.
+    now_str is the batch timestamp for updated_at (taken per call when omitted).
+    Top-level and free of shared state so blocks can be parsed in worker processes.
+    """
+    date_token, time_token, block_text = block
+    if not block_text or not block_text.strip():
+        return None
+    if 'DATE_RANGE_RE' in globals() and DATE_RANGE_RE.search(block_text):
+        return None
+
+    # If the block appears to be part of a page header context, skip.
+    # PAGE_HEADER_MARKERS_RE includes "transaction\s+details", so this also rejects every block
+    # carrying the "(Date) Transaction Details (Type Amount)" header keywords.
+    if 'PAGE_HEADER_MARKERS_RE' in globals() and PAGE_HEADER_MARKERS_RE.search(block_text):
+        return None
+
+    # extract payee
+    paid_to = ""
+    m_paid = PAID_TO_RE.search(block_text)
+    if m_paid:
+        paid_to = m_paid.group(2).strip().rstrip(",")
+    else:
+        parts = SPLIT_FIELDS_RE.split(block_text)
+        paid_to = parts[0].strip().strip(" ,:-") if parts else ""
+
+    # INR amount and Debit/Credit words in a single pass; the first amount counts
+    inr_amount = None
+    type_words = set()
+    for m in BLOCK_FIELDS_RE.finditer(block_text):
+        if m.lastgroup == "type_word":
+            type_words.add(m.group("type_word").lower())
+        elif inr_amount is None:
+            inr_amount = m.group("inr")
+
+    txn_id = ""
+    m_txn = TXN_ID_RE.search(block_text)
+    if m_txn:
+        txn_id = m_txn.group(1).strip()
+    else:
+        m_unl = UNLABELLED_TXN_ID_RE.search(block_text)
+        if m_unl:
+            cand = m_unl.group(1)
+            if len(cand) >= 6 and not cand.isdigit():
+                txn_id = cand
+
+    utr = ""
+    m_utr = UTR_RE.search(block_text)
+    if m_utr:
+        utr = m_utr.group(1).strip()
+
+    # amount and type
+    txn_type = ""
+    amount_txt = ""
+    if inr_amount is not None:
+        amount_txt = inr_amount.replace(",", "")
+    else:
+        # only the last number is wanted; walk the matches instead of materialising them all
+        m_last = None
+        for m_last in AMOUNT_RE.finditer(block_text):
+            pass
+        if m_last:
+            amount_txt = m_last.group(1).replace(",", "")
+
+    if "debit" in type_words:
+        txn_type = "Debit"
+    elif "credit" in type_words:
+        txn_type = "Credit"
+
+    amount_val = None
+    if amount_txt:
+        try:
+            amount_val = f"{float(amount_txt):.2f}"
+        except Exception:
+            amount_val = amount_txt
+    # sign convention
+    if txn_type and txn_type.lower() == "debit" and amount_val:
+        try:
+            amount_val = f"-{abs(float(amount_val)):.2f}"
+        except Exception:
+            pass
+
+    # fallback: try to find any date anywhere in block_text
+    if not date_token:
+        mdt = DATE_FIND_RE.search(block_text)
+        if mdt:
+            date_token = mdt.group(1).strip()
+
+    if not date_token:
+        # can't assign date reliably; skip
+        return None
+
+    # fallback: from block_text
+    if not time_token:
+        mt = TIME_FIND_RE.search(block_text)
+        if mt:
+            time_token = mt.group(1).strip()
+
+    # normalize date/time
+    date_norm = normalize_date(date_token)
+    time_norm = normalize_time(time_token)
+    ts_time = time_norm or "00:00"
+    if now_str is None:
+        now_str = datetime.now().isoformat(sep=" ", timespec="microseconds")
+    try:
+        created_dt = datetime.fromisoformat(f"{date_norm} {ts_time}")
+        created_at = created_dt.isoformat(sep=" ", timespec="microseconds")
+    except Exception:
+        created_at = now_str
+    updated_at = now_str
+
+    rec = {
+        "date": date_norm,
+        "time": time_norm,
+        "created_at": created_at,
+        "updated_at": updated_at,
+        "name": paid_to or "PhonePe",
+        "transaction_id": txn_id or None,
+        "utr_no": utr or None,
+        "type": txn_type or None,
+        "amount": amount_val,
+    }
+    return rec
+
+
+# form-feeds (page breaks) and carriage returns become spaces in parse_pdf2txt_lines
+# (NULs too: _first_match_per_line joins lines with NUL)
+_NORMALIZE_TABLE = str.maketrans({"\f": " ", "\r": " ", "\0": " "})
+
+
+def _first_match_per_line(pattern: re.Pattern, lines: List[str]) -> List[Optional[str]]:
+    """
+    [pattern.search(ln).group(1).strip() or None for ln in lines], from a single finditer over
+    the NUL-joined lines (one C-level scan instead of a Python-level search per line). None of
+    the patterns used here match NUL, so no match can run across a line boundary.
+    """
+    starts = []
+    pos = 0
+    for ln in lines:
+        starts.append(pos)
+        pos += len(ln) + 1
+    found: List[Optional[str]] = [None] * len(lines)
+    for m in pattern.finditer("\0".join(lines)):
+        i = bisect_right(starts, m.start()) - 1
+        if found[i] is None:
+            found[i] = m.group(1).strip()
+    return found
+
+
+def _is_header_name(nm: str) -> bool:
+    """
+    True if a parsed name is really a date-range or page-header fragment.
+    Each regex is gated by a substring test it cannot match without (every date form
+    has a ',', '-' or '/'; every header marker has "transaction" or ends in "date"),
+    so ordinary merchant names never reach the regex engine.
+    """
+    if ("," in nm or "-" in nm or "/" in nm) and DATE_RANGE_RE.search(nm):
+        return True
+    low = nm.lower()
+    if ("transaction" in low or low.rstrip().endswith("date")) and PAGE_HEADER_MARKERS_RE.search(nm):
+        return True
+    return False
+
+
 def parse_pdf2txt_lines(lines: List[str]) -> List[Dict]:
     """
     Robust parser that handles page breaks, tail-of-line details, and stray amount lines.
@@ -567,22 +816,22 @@ def parse_pdf2txt_lines(lines: List[str]) -> List[Dict]:
       * Identify date line indices as anchors
       * Build blocks from date line tail + following lines up to next date index
       * Track which input line indices were consumed
-      * After initial pass, find any leftover lines that look like transaction lines (contain amount/INR)
+      * After initial pass, find any leftover lines that look like transaction lines (INR/₹/Rs amount)
         and attach them to the nearest previous date anchor, then parse them into records.
       * Deduplicate records using (date, transaction_id, utr_no, amount) key.
     """
     records = []
     n = len(lines)
 
-    # normalize lines: replace form-feed and CRs, keep mapping of normalized lines to original indices
-    norm_lines = []
-    orig_idx_map = []
-    for idx, ln in enumerate(lines):
-        if ln is None:
-            ln = ""
-        ln2 = ln.replace("\f", " ").replace("\r", " ").rstrip("\n")
-        norm_lines.append(ln2)
-        orig_idx_map.append(idx)
+    # normalize lines: replace form-feed, CRs and NULs (one translate pass per line); indices match `lines`
+    norm_lines = [(ln or "").translate(_NORMALIZE_TABLE).rstrip("\n") for ln in lines]
+
+    # strip every line once; blocks are joined from these
+    stripped = [ln.strip() for ln in norm_lines]
+
+    # scan every line for a date and a time token exactly once; anchors and blocks reuse these
+    line_dates = _first_match_per_line(DATE_FIND_RE, norm_lines)
+    line_times = _first_match_per_line(TIME_FIND_RE, norm_lines)
 
     # find indices with dates
     # date_indices = []
@@ -597,9 +846,9 @@ def parse_pdf2txt_lines(lines: List[str]) -> List[Dict]:
 
     date_indices = []
     date_matches = {}
-    for idx, line in enumerate(norm_lines):
-        ln = line.strip()
-        if not ln:
+    for idx, ln in enumerate(stripped):
+        # Only lines carrying a date token can become anchors; everything below is for those
+        if not ln or not line_dates[idx]:
             continue
 
         # Skip lines that are explicit date-range headers like "Oct 28, 2025 - Nov 27, 2025"
@@ -607,23 +856,18 @@ def parse_pdf2txt_lines(lines: List[str]) -> List[Dict]:
             continue
 
         # If the line itself is a lone header token like "Date" or "Transaction Details", skip it
-        if ln.lower() in ("date", "transaction details", "date transaction details"):
+        if ln.lower() in LONE_HEADER_TOKENS:
             continue
 
         # If the nearby context indicates a page header, skip treating this as a date anchor.
         # Look up to 3 lines back and 2 lines ahead for header markers (masked mobile, "Transaction Statement for", etc.)
-        context_window = " ".join(
-            [norm_lines[i].strip() for i in range(max(0, idx-3), min(len(norm_lines), idx+3)) if norm_lines[i].strip()]
-        )
+        context_window = " ".join([c for c in stripped[max(0, idx-3):idx+3] if c])
         if 'PAGE_HEADER_MARKERS_RE' in globals() and PAGE_HEADER_MARKERS_RE.search(context_window):
             # This date is embedded in a page header block — ignore as anchor.
             continue
 
-        # Normal date detection
-        m = DATE_FIND_RE.search(ln)
-        if m:
-            date_indices.append(idx)
-            date_matches[idx] = m.group(1).strip()
+        date_indices.append(idx)
+        date_matches[idx] = line_dates[idx]
 
 
     if not date_indices:
@@ -631,147 +875,22 @@ def parse_pdf2txt_lines(lines: List[str]) -> List[Dict]:
 
     used_line_idxs = set()
 
-    # helper to parse block_text (extract transaction fields)
-    def parse_block_text(block_text, consumed_idxs) -> Optional[dict]:
-        if not block_text or not block_text.strip():
-            return None
-        lowb = block_text.lower()
-        if 'DATE_RANGE_RE' in globals() and DATE_RANGE_RE.search(block_text):
-            return None
-
-        # If the block appears to be part of a page header context, skip
-        if 'PAGE_HEADER_MARKERS_RE' in globals() and PAGE_HEADER_MARKERS_RE.search(block_text):
-            return None
-
-        # If a known header/footer phrase exists in the block, truncate the block at its first occurrence
-        first_pos = None
-        for hk in HEADER_KEYWORDS:
-            pos = lowb.find(hk)
-            if pos != -1 and (first_pos is None or pos < first_pos):
-                first_pos = pos
-        if first_pos is not None:
-            block_text = block_text[:first_pos].strip()
-            lowb = block_text.lower()
-        if not block_text:
-            return None
-
-        # extract payee
-        paid_to = ""
-        m_paid = re.search(
-            r"(Paid to|Received from|Bill paid -|Bill paid)\s*(.+?)(?=(Transaction ID|UTR|INR|Debit|Credit|$))",
-            block_text,
-            re.IGNORECASE,
-        )
-        if m_paid:
-            paid_to = m_paid.group(2).strip().rstrip(",")
-        else:
-            parts = re.split(r"Transaction\s*ID|UTR|INR|Debited\s*from|Credited\s*to|Debit|Credit", block_text, flags=re.IGNORECASE)
-            paid_to = parts[0].strip().strip(" ,:-") if parts else ""
-
-        # txn id and utr
-        txn_id = ""
-        mtx = TXN_ID_RE.search(block_text)
-        if mtx:
-            txn_id = mtx.group(1).strip()
-        else:
-            m_unl = re.search(r"\b([A-Z]{1,4}\d{5,}[A-Za-z0-9]*)\b", block_text)
-            if m_unl:
-                cand = m_unl.group(1)
-                if len(cand) >= 6 and not re.match(r"^\d+$", cand):
-                    txn_id = cand
-
-        utr = ""
-        mut = UTR_RE.search(block_text)
-        if mut:
-            utr = mut.group(1).strip()
-
-        # amount and type
-        txn_type = ""
-        amount_txt = ""
-        m_inr = INR_AMT_RE.search(block_text)
-        if m_inr:
-            amount_txt = m_inr.group(1).replace(",", "")
-        else:
-            ams = AMOUNT_RE.findall(block_text)
-            if ams:
-                amount_txt = ams[-1].replace(",", "")
-
-        if DEBIT_WORD_RE.search(block_text):
-            txn_type = "Debit"
-        elif CREDIT_WORD_RE.search(block_text):
-            txn_type = "Credit"
-
-        amount_val = None
-        if amount_txt:
-            try:
-                amount_val = f"{float(amount_txt):.2f}"
-            except Exception:
-                amount_val = amount_txt
-        # sign convention
-        if txn_type and txn_type.lower() == "debit" and amount_val:
-            try:
-                amount_val = f"-{abs(float(amount_val)):.2f}"
-            except Exception:
-                pass
-
-        # try to find date token from nearby consumed indices by checking the original lines for date
+    # date/time tokens from the block's own lines, then the block itself for _parse_one_block
+    def block_tokens(block_text, consumed_idxs) -> Tuple[Optional[str], str, str]:
         date_token = None
         for i in consumed_idxs:
-            ln = norm_lines[i]
-            m = DATE_FIND_RE.search(ln)
-            if m:
-                date_token = m.group(1).strip()
+            if line_dates[i]:
+                date_token = line_dates[i]
                 break
-        # fallback: try to find any date anywhere in block_text
-        if not date_token:
-            mdt = DATE_FIND_RE.search(block_text)
-            if mdt:
-                date_token = mdt.group(1).strip()
-
-        if not date_token:
-            # can't assign date reliably; skip
-            return None
-
-        # time extraction: look for time in consumed_idxs lines
         time_token = ""
         for i in consumed_idxs:
-            ln = norm_lines[i]
-            mt = TIME_FIND_RE.search(ln)
-            if mt:
-                time_token = mt.group(1).strip()
+            if line_times[i]:
+                time_token = line_times[i]
                 break
-        # fallback: from block_text
-        if not time_token:
-            mt = TIME_FIND_RE.search(block_text)
-            if mt:
-                time_token = mt.group(1).strip()
-
-        # normalize date/time
-        date_norm = normalize_date(date_token)
-        time_norm = normalize_time(time_token)
-        ts_time = time_norm or "00:00"
-        try:
-            created_dt = datetime.strptime(f"{date_norm} {ts_time}", "%Y-%m-%d %H:%M")
-            created_at = created_dt.strftime("%Y-%m-%d %H:%M:%S.%f")
-        except Exception:
-            created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-        updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-
-        rec = {
-            "date": date_norm,
-            "time": time_norm,
-            "created_at": created_at,
-            "updated_at": updated_at,
-            "name": paid_to or "PhonePe",
-            "transaction_id": txn_id or None,
-            "utr_no": utr or None,
-            "type": txn_type or None,
-            "amount": amount_val,
-            "_consumed_idxs": consumed_idxs.copy(),
-        }
-        return rec
+        return (date_token, time_token, block_text)
 
     # initial pass: build blocks between date indices
+    blocks = []
     for pos_idx, start in enumerate(date_indices):
         end = date_indices[pos_idx + 1] if pos_idx + 1 < len(date_indices) else len(norm_lines)
         # collect indices from start to end-1
@@ -779,29 +898,38 @@ def parse_pdf2txt_lines(lines: List[str]) -> List[Dict]:
         # mark used lines
         for ii in idxs:
             used_line_idxs.add(ii)
-        # build and parse block
-        block_lines = [norm_lines[i] for i in idxs]
-        block_text = " ".join([b.strip() for b in block_lines if b.strip()])
-        rec = parse_block_text(block_text, idxs)
-        if rec:
-            records.append(rec)
+        # build block; parsing happens below, in worker processes for long statements
+        block_text = " ".join([b for b in stripped[start:end] if b])
+        blocks.append(block_tokens(block_text, idxs))
+
+    # one timestamp for the whole batch, shared by every record's updated_at
+    now_str = datetime.now().isoformat(sep=" ", timespec="microseconds")
+    if len(blocks) >= PARALLEL_PARSE_MIN_BLOCKS:
+        with ProcessPoolExecutor() as ex:
+            parsed_blocks = list(ex.map(_parse_one_block, blocks, repeat(now_str), chunksize=64))
+    else:
+        parsed_blocks = [_parse_one_block(b, now_str) for b in blocks]
+    records.extend(rec for rec in parsed_blocks if rec)
 
-    # secondary pass: find stray lines that contain amount or INR but were not used; attach to previous date anchor
+    # secondary pass: find stray lines with a currency amount that were not used; attach to previous date anchor
     stray_amount_idxs = []
     for idx, ln in enumerate(norm_lines):
         if idx in used_line_idxs:
             continue
-        if INR_AMT_RE.search(ln) or AMOUNT_RE.search(ln):
-            if ln.strip():
-                stray_amount_idxs.append(idx)
+        if _STRAY_LINE_RE.search(ln):
+            stray_amount_idxs.append(idx)
+
+    # keys of records seen so far, for the duplicate check below
+    seen_txn_ids = {r["transaction_id"] for r in records if r.get("transaction_id")}
+    seen_date_amt = {(r.get("date"), r["amount"]) for r in records if r.get("amount")}
 
     # attach each stray line to nearest previous date index
     for sidx in stray_amount_idxs:
         # find previous date anchor index
-        prev_dates = [d for d in date_indices if d < sidx]
-        if not prev_dates:
+        pos = bisect_right(date_indices, sidx) - 1
+        if pos < 0:
             continue
-        anchor = prev_dates[-1]
+        anchor = date_indices[pos]
         # create consumed idx list: anchor..sidx
         idxs = list(range(anchor, sidx+1))
         # avoid reusing already used indices in this constructed block
@@ -810,24 +938,24 @@ def parse_pdf2txt_lines(lines: List[str]) -> List[Dict]:
             continue
         for ii in new_idxs:
             used_line_idxs.add(ii)
-        block_lines = [norm_lines[i] for i in sorted(set([anchor] + new_idxs))]
-        block_text = " ".join([b.strip() for b in block_lines if b.strip()])
-        rec = parse_block_text(block_text, sorted(set([anchor] + new_idxs)))
+        block_idxs = sorted(set([anchor] + new_idxs))
+        block_text = " ".join([stripped[i] for i in block_idxs if stripped[i]])
+        rec = _parse_one_block(block_tokens(block_text, block_idxs), now_str)
         if rec:
             # avoid duplicates: check if same txn_id+date+amount exists
-            dup = False
-            for ex in records:
-                if rec.get("transaction_id") and ex.get("transaction_id") and rec["transaction_id"] == ex["transaction_id"]:
-                    dup = True; break
-                if rec.get("amount") and ex.get("amount") and rec["amount"] == ex["amount"] and rec.get("date") == ex.get("date"):
-                    dup = True; break
+            txn_id = rec.get("transaction_id")
+            date_amt = (rec.get("date"), rec.get("amount"))
+            dup = (txn_id and txn_id in seen_txn_ids) or (date_amt[1] and date_amt in seen_date_amt)
             if not dup:
                 records.append(rec)
+                if txn_id:
+                    seen_txn_ids.add(txn_id)
+                if date_amt[1]:
+                    seen_date_amt.add(date_amt)
 
-    # final: remove internal helper key before returning
-    for r in records:
-        if "_consumed_idxs" in r:
-            del r["_consumed_idxs"]
+    # Final defensive filter, before sorting so there is less to sort:
+    # drop any parsed record whose name looks like a page header / date-range
+    records = [r for r in records if (r.get('name') or '').strip() and not _is_header_name(r['name'].strip())]
 
     # sort records by date+time for predictability
     try:
@@ -835,43 +963,54 @@ def parse_pdf2txt_lines(lines: List[str]) -> List[Dict]:
     except Exception:
         pass
 
-
-    # Final defensive filter: drop any parsed record whose name looks like a page header / date-range
-    filtered = []
-    for r in records:
-        nm = (r.get('name') or '').strip()
-        if not nm:
-            continue
-        if 'DATE_RANGE_RE' in globals() and DATE_RANGE_RE.search(nm):
-            # skip header-like names
-            continue
-        if 'PAGE_HEADER_MARKERS_RE' in globals() and PAGE_HEADER_MARKERS_RE.search(nm):
-            continue
-        filtered.append(r)
-    records = filtered
-
     return records
 
 def parse_txt_file(path: Path) -> List[Dict]:
     with open(path, "r", encoding="utf-8", errors="ignore") as fh:
         lines = [ln.rstrip("\n") for ln in fh]
+    return parse_lines(lines)
+
+
+def parse_lines(lines: List[str]) -> List[Dict]:
     # return parse_pdf2txt_lines(lines)
     # return parse_text_for_records(lines)
     return parse_text_for_tx(lines)
 
 
-def extract_mobiles_from_pdf(pdf_path: Path) -> List[str]:
+def read_first_page_text(pdf_src: Union[Path, bytes]) -> str:
+    """Text of the statement's first page; parsed once and shared by the mobile extractors."""
     try:
-        reader = PdfReader(str(pdf_path))
-        if not reader.pages:
-            return []
-        first_page = reader.pages[0]
-        text = first_page.extract_text() or ""
+        pdf = pdfium.PdfDocument(pdf_src if isinstance(pdf_src, bytes) else str(pdf_src))
+        try:
+            if len(pdf) == 0:
+                return ""
+            return pdf[0].get_textpage().get_text_range() or ""
+        finally:
+            pdf.close()
+    except Exception:
+        logger.exception("Failed reading first page of PDF")
+        return ""
 
-        found = []
-        pattern = re.compile(r"^Transaction Statement for\s+(\+?\d{10,15})")
 
-        m = pattern.search(text)
+# mobile number / mobile mask patterns (page 1 of the PDF, head of a .txt statement)
+_STATEMENT_FOR_RE = re.compile(r"^Transaction Statement for\s+(\+?\d{10,15})")
+_FULL_MOBILE_RE = re.compile(r"\+?\d{10,13}")
+_MASKED_MOBILE_RE = re.compile(r"\+?\s*9?1?[0-9Xx\-\s]{6,}\d{2,4}", re.IGNORECASE)
+_TXT_MASKED_MOBILE_RE = re.compile(r"\+\s*(?:X|x|\d|[\s-]){6,}\d{2,4}")
+_NON_PHONE_CHARS_RE = re.compile(r"[^\d\+]")
+_MASK_TRIM_RE = re.compile(r"[ \-]")
+_MASK_X_RE = re.compile(r"[xX]")
+
+
+def normalize_masks(masks: Iterable[str]) -> List[str]:
+    """Masks without spaces/dashes and with an upper-case X for every hidden digit."""
+    return [_MASK_X_RE.sub("X", _MASK_TRIM_RE.sub("", m)) for m in masks]
+
+
+def extract_mobiles_from_pdf(text: str) -> List[str]:
+    try:
+        found = []
+        m = _STATEMENT_FOR_RE.search(text)
         if m:
             mobile = m.group(1)
             print("Found:", mobile)
@@ -882,87 +1021,206 @@ def extract_mobiles_from_pdf(pdf_path: Path) -> List[str]:
         return []
 
 
-def extract_masked_mobiles_from_pdf(pdf_path: Path) -> List[str]:
+def extract_masked_mobiles_from_pdf(text: str) -> List[str]:
     try:
-        reader = PdfReader(str(pdf_path))
-        if not reader.pages:
-            return []
-        first_page = reader.pages[0]
-        text = first_page.extract_text() or ""
-
-        pat_full = re.compile(r"\+?\d{10,13}")
-        pat_masked = re.compile(r"\+?\s*9?1?[0-9Xx\-\s]{6,}\d{2,4}", re.IGNORECASE)
-
         found = []
-        for m in pat_full.finditer(text):
-            s = m.group(0)
-            s = re.sub(r"[^\d\+]", "", s)
+        for m in _FULL_MOBILE_RE.finditer(text):
+            s = _NON_PHONE_CHARS_RE.sub("", m.group(0))
             if s not in found:
                 found.append(s)
 
-        for m in pat_masked.finditer(text):
-            s = m.group(0)
-            s = re.sub(r"[ \-]", "", s)
+        for m in _MASKED_MOBILE_RE.finditer(text):
+            s = _MASK_TRIM_RE.sub("", m.group(0))
             if s not in found:
                 found.append(s)
 
-        found = [re.sub(r"x", "X", f, flags=re.IGNORECASE) for f in found]
-        return found
+        return [_MASK_X_RE.sub("X", f) for f in found]
     except Exception:
         logger.exception("Failed extracting masked mobiles from PDF header")
         return []
 
 
+# deletes spaces and dashes (masks are compared without separators)
+_STRIP_SPACES_DASHES = str.maketrans("", "", " -")
+
+
+_MASK_TAIL_RE = re.compile(r"(\d{3,4})$")
+
+
+@lru_cache(maxsize=32)
+def _mask_matchers(masks: Tuple[str, ...]):
+    """
+    Per mask set, compiled once: the (mask, normalized mask) pairs, the (mask, tail-digits
+    pattern) pairs, and one alternation over all tail digits that rules most texts out in a
+    single scan.
+    """
+    cmp_masks = [(m, m.lower().translate(_STRIP_SPACES_DASHES)) for m in masks]
+    tails = []
+    for m in masks:
+        tail = _MASK_TAIL_RE.search(m)
+        if tail:
+            tails.append((m, tail.group(1)))
+    any_tail = re.compile(r"\b(?:" + "|".join(re.escape(t) for _, t in tails) + r")\b") if tails else None
+    tail_res = [(m, re.compile(r"\b" + re.escape(t) + r"\b")) for m, t in tails]
+    return cmp_masks, tail_res, any_tail
+
+
 def find_mask_in_text(block_text: str, masks: Iterable[str]) -> Optional[str]:
     if not block_text or not masks:
         return None
-    low = block_text.lower()
-    for m in masks:
-        cmp_m = m.lower().replace("-", "").replace(" ", "")
-        if cmp_m in re.sub(r"[ \-]", "", low):
+    cmp_masks, tail_res, any_tail = _mask_matchers(tuple(masks))
+    low = block_text.lower().translate(_STRIP_SPACES_DASHES)
+    for m, cmp_m in cmp_masks:
+        if cmp_m in low:
+            return m
+    if any_tail is None or not any_tail.search(block_text):
+        return None
+    # masks keep their priority order, so the first mask whose tail appears wins
+    for m, tail_re in tail_res:
+        if tail_re.search(block_text):
             return m
-    for m in masks:
-        tail = re.search(r"(\d{3,4})$", m)
-        if tail:
-            t = tail.group(1)
-            if re.search(r"\b" + re.escape(t) + r"\b", block_text):
-                return m
     return None
 
 # ----------------------
 # DB helpers: lookup by mobile and by account_name in locked_attributes
+#
+# The lookups below compare expressions over accounts.locked_attributes; without matching
+# expression indexes each one is a sequential scan of accounts. Recommended migration
+# (run outside a transaction, e.g. with psql -f):
+#
+#   CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_accounts_lower_acctname
+#       ON accounts ((lower(locked_attributes->>'account_name')));
+#   CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_accounts_account_number
+#       ON accounts ((locked_attributes->>'account_number'));
+#   CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_accounts_mobile
+#       ON accounts ((locked_attributes->>'mobile'));
+#   -- substring category fallback (lower(entries.name) LIKE '%name%'):
+#   CREATE EXTENSION IF NOT EXISTS pg_trgm;
+#   CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_entries_lower_name_trgm
+#       ON entries USING gin ((lower(name)) gin_trgm_ops);
 # ----------------------
 def connect_to_postgres():
-    load_dotenv()
-    host = os.getenv("SURE_DB_HOST") or os.getenv("DB_HOST") or "localhost"
-    port = int(os.getenv("SURE_DB_PORT") or os.getenv("DB_PORT") or 5432)
-    db = os.getenv("SURE_DB_NAME") or os.getenv("DB_NAME")
-    user = os.getenv("SURE_DB_USER") or os.getenv("DB_USER")
-    pw = os.getenv("SURE_DB_PASSWORD") or os.getenv("DB_PASSWORD")
-    if not all([db, user, pw]):
+    if not all([DB_NAME, DB_USER, DB_PASSWORD]):
         logger.error("Missing DB configuration in environment. Please set SURE_DB_NAME, SURE_DB_USER, SURE_DB_PASSWORD")
         return None
     try:
-        conn = psycopg2.connect(host=host, port=port, dbname=db, user=user, password=pw)
+        conn = psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
         return conn
     except Exception:
         logger.exception("Database connection failed")
         return None
 
 
+def connect_pool(maxconn: int):
+    """ThreadedConnectionPool with connect_to_postgres' settings, or None if it can't be opened."""
+    if not all([DB_NAME, DB_USER, DB_PASSWORD]):
+        logger.error("Missing DB configuration in environment. Please set SURE_DB_NAME, SURE_DB_USER, SURE_DB_PASSWORD")
+        return None
+    try:
+        return psycopg2.pool.ThreadedConnectionPool(
+            1, maxconn, host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+        )
+    except Exception:
+        logger.exception("Database connection pool failed")
+        return None
+
+
+# Per-connection memo for the lookup helpers below, {conn: {kind: {key: result}}}.
+# A statement repeats the same payees and payers many times; results live as long as the connection.
+_LOOKUP_CACHES = weakref.WeakKeyDictionary()
+
+
+def lookup_cache(conn, kind: str) -> Dict:
+    """Return the `kind` memo dict for `conn` (created empty on first use)."""
+    caches = _LOOKUP_CACHES.get(conn)
+    if caches is None:
+        caches = _LOOKUP_CACHES[conn] = {}
+    return caches.setdefault(kind, {})
+
+
+# The hot per-record lookups, PREPAREd once per connection and run with EXECUTE so the server
+# parses and plans each of them once per session instead of once per call.
+LOOKUP_STATEMENTS = {
+    "lookup_acct_by_number":
+        "SELECT id, name FROM accounts WHERE locked_attributes->>'account_number' = $1 LIMIT 1",
+    "lookup_acct_by_mobile":
+        "SELECT id, name FROM accounts WHERE locked_attributes->>'mobile' = $1 LIMIT 1",
+    "lookup_acct_by_name":
+        "SELECT id, locked_attributes->>'account_name' AS account_name FROM accounts "
+        "WHERE lower(locked_attributes->>'account_name') = $1 LIMIT 1",
+    "lookup_txn_category_exact": """
+        SELECT t.category_id, COUNT(*) AS cnt
+        FROM entries e
+        JOIN transactions t ON e.entryable_id = t.id
+        WHERE lower(e.name) = lower($1)
+          AND t.category_id IS NOT NULL
+          AND (e.entryable_type ILIKE 'transaction' OR e.entryable_type ILIKE 'transactions' OR e.entryable_type ILIKE 'Transaction' OR e.entryable_type ILIKE 'Transactions')
+        GROUP BY t.category_id
+        ORDER BY cnt DESC
+        LIMIT 1
+    """,
+    "lookup_txn_category_like": """
+        SELECT t.category_id, COUNT(*) AS cnt
+        FROM entries e
+        JOIN transactions t ON e.entryable_id = t.id
+        WHERE lower(e.name) LIKE $1
+          AND t.category_id IS NOT NULL
+          AND (e.entryable_type ILIKE 'transaction' OR e.entryable_type ILIKE 'transactions' OR e.entryable_type ILIKE 'Transaction' OR e.entryable_type ILIKE 'Transactions')
+        GROUP BY t.category_id
+        ORDER BY cnt DESC
+        LIMIT 1
+    """,
+}
+
+# Connections whose session already has LOOKUP_STATEMENTS prepared. Weak, like _LOOKUP_CACHES,
+# so closed connections (pooled ones after closeall()) can be freed; a cached cursor would
+# hold its connection alive.
+_LOOKUPS_PREPARED = weakref.WeakSet()
+
+
+def lookup_cursor(conn):
+    """
+    Return a new cursor on `conn` for the prepared lookups, PREPARE-ing LOOKUP_STATEMENTS the
+    first time the connection is seen. Prepared statements belong to the session, not the
+    cursor (and a later rollback does not drop them), so every lookup can use a fresh cursor.
+
+    For the same reason a PREPARE that fails partway leaves the earlier statements on the
+    session, so names already in pg_prepared_statements are skipped, and the connection only
+    counts as ready once every statement is in place.
+    """
+    cur = conn.cursor()
+    if conn not in _LOOKUPS_PREPARED:
+        try:
+            cur.execute("SELECT name FROM pg_prepared_statements WHERE name = ANY(%s)", (list(LOOKUP_STATEMENTS),))
+            already = {row[0] for row in cur.fetchall()}
+            for stmt_name, sql in LOOKUP_STATEMENTS.items():
+                if stmt_name not in already:
+                    cur.execute(f"PREPARE {stmt_name} AS {sql}")
+        except Exception:
+            cur.close()
+            # the failed statement aborted the transaction; nothing in it can commit anyway
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        _LOOKUPS_PREPARED.add(conn)
+    return cur
+
+
 def lookup_self_account_from_payer(conn, payer: Optional[str]) ->Tuple[str, str]:
     if not payer:
         return None
 
+    cache = lookup_cache(conn, "self_by_payer")
+    if payer in cache:
+        return cache[payer]
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id,name FROM accounts WHERE locked_attributes->>'account_number' = %s LIMIT 1",
-                (payer,),
-            )
+        with lookup_cursor(conn) as cur:
+            cur.execute("EXECUTE lookup_acct_by_number (%s)", (payer,))
             row = cur.fetchone()
-            if row:
-                return (row[0],row[1])
+            cache[payer] = (row[0],row[1]) if row else None
+            return cache[payer]
     except Exception:
         logger.exception("lookup_self_account_from_payer failed")
     return None
@@ -978,24 +1236,24 @@ def lookup_self_account_by_mobile(conn, mask: Optional[str]) ->Tuple[str, str]:
     if len(mask) == 10:
         mask = '+91' + mask
 
+    cache = lookup_cache(conn, "self_by_mobile")
+    if mask in cache:
+        return cache[mask]
     try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id,name FROM accounts WHERE locked_attributes->>'mobile' = %s LIMIT 1",
-                (mask,),
-            )
+        with lookup_cursor(conn) as cur:
+            cur.execute("EXECUTE lookup_acct_by_mobile (%s)", (mask,))
             row = cur.fetchone()
             if row:
-                return (row[0],row[1])
+                cache[mask] = (row[0],row[1])
+                return cache[mask]
             # try without '+'
             if mask.startswith("+"):
-                cur.execute(
-                    "SELECT id,name FROM accounts WHERE locked_attributes->>'mobile' = %s LIMIT 1",
-                    (mask.lstrip("+"),),
-                )
+                cur.execute("EXECUTE lookup_acct_by_mobile (%s)", (mask.lstrip("+"),))
                 row2 = cur.fetchone()
                 if row2:
-                    return (row2[0],row2[1])
+                    cache[mask] = (row2[0],row2[1])
+                    return cache[mask]
+            cache[mask] = None
     except Exception:
         logger.exception("lookup_self_account_by_mobile failed")
     return None
@@ -1003,83 +1261,65 @@ def lookup_self_account_by_mobile(conn, mask: Optional[str]) ->Tuple[str, str]:
 
 def lookup_account_by_name(conn, name: str) -> Optional[Dict]:
     """
-    Lookup accounts table for a record whose locked_attributes->>'account_name' loosely matches `name`.
+    Lookup accounts table for a record whose locked_attributes->>'account_name' matches `name`.
     Returns a dict with account id and account_name if found, otherwise None.
 
-    Uses case-insensitive substring match via ILIKE.
+    Uses a case-insensitive exact match on lower(account_name).
     """
     if not name:
         return None
+    cache = lookup_cache(conn, "account_by_name")
+    key = name.strip().lower()
+    if key in cache:
+        return cache[key]
     try:
-        with conn.cursor() as cur:
+        with lookup_cursor(conn) as cur:
             # pattern = f"%{name.strip().lower()}%"
             pattern = f"{name.strip().lower()}"
-            # Use lower(...) comparison for portability
-            cur.execute(
-                "SELECT id, locked_attributes->>'account_name' AS account_name FROM accounts WHERE lower(locked_attributes->>'account_name') LIKE %s LIMIT 1",
-                (pattern,),
-            )
+            # exact match on lower(...) so idx_accounts_lower_acctname can serve it
+            cur.execute("EXECUTE lookup_acct_by_name (%s)", (pattern,))
             row = cur.fetchone()
-            if row:
-                return {"account_id": row[0], "account_name": row[1] or ""}
+            cache[key] = {"account_id": row[0], "account_name": row[1] or ""} if row else None
+            return cache[key]
     except Exception:
         logger.exception("lookup_account_by_name failed")
     return None
 
 
-def lookup_category_for_name_from_transactions(conn, name: str) -> Optional[str]:
+def lookup_category_for_name_from_transactions(conn, name: str, exact: bool = True) -> Optional[str]:
     """
     Return the most common transactions.category_id for entries whose
     entryable is a transaction and whose entries.name matches `name`.
 
     Strategy:
-      1) Exact case-insensitive match on entries.name
+      1) Exact case-insensitive match on entries.name (skipped with exact=False,
+         when bulk_lookup_categories_by_name has already answered it)
       2) Fallback: case-insensitive substring match on entries.name (LIKE '%name%')
       3) Return the category_id with the highest count, or None if none found.
     """
     if not name:
         return None
 
+    cache = lookup_cache(conn, "category_from_transactions")
+    key = name.lower()
+    if key in cache:
+        return cache[key]
     try:
-        with conn.cursor() as cur:
-            # 1) exact (case-insensitive) match; restrict to likely transaction entryable_types
-            cur.execute(
-                """
-                SELECT t.category_id, COUNT(*) AS cnt
-                FROM entries e
-                JOIN transactions t ON e.entryable_id = t.id
-                WHERE lower(e.name) = lower(%s)
-                  AND t.category_id IS NOT NULL
-                  AND (e.entryable_type ILIKE 'transaction' OR e.entryable_type ILIKE 'transactions' OR e.entryable_type ILIKE 'Transaction' OR e.entryable_type ILIKE 'Transactions')
-                GROUP BY t.category_id
-                ORDER BY cnt DESC
-                LIMIT 1
-                """,
-                (name,),
-            )
-            row = cur.fetchone()
-            if row and row[0]:
-                return row[0]
+        with lookup_cursor(conn) as cur:
+            if exact:
+                # 1) exact (case-insensitive) match; restrict to likely transaction entryable_types
+                cur.execute("EXECUTE lookup_txn_category_exact (%s)", (name,))
+                row = cur.fetchone()
+                if row and row[0]:
+                    cache[key] = row[0]
+                    return row[0]
 
             # 2) fallback: substring match using lower(name) LIKE %pattern%
             pattern = f"%{name.strip().lower()}%"
-            cur.execute(
-                """
-                SELECT t.category_id, COUNT(*) AS cnt
-                FROM entries e
-                JOIN transactions t ON e.entryable_id = t.id
-                WHERE lower(e.name) LIKE %s
-                  AND t.category_id IS NOT NULL
-                  AND (e.entryable_type ILIKE 'transaction' OR e.entryable_type ILIKE 'transactions' OR e.entryable_type ILIKE 'Transaction' OR e.entryable_type ILIKE 'Transactions')
-                GROUP BY t.category_id
-                ORDER BY cnt DESC
-                LIMIT 1
-                """,
-                (pattern,),
-            )
+            cur.execute("EXECUTE lookup_txn_category_like (%s)", (pattern,))
             row2 = cur.fetchone()
-            if row2 and row2[0]:
-                return row2[0]
+            cache[key] = row2[0] if row2 and row2[0] else None
+            return cache[key]
     except Exception:
         # keep behavior consistent with your other helpers: log, rollback attempt, then return None
         try:
@@ -1103,6 +1343,10 @@ def lookup_category_for_name(conn, name: str) -> Optional[str]:
     """
     if not name:
         return None
+    cache = lookup_cache(conn, "category_for_name")
+    key = name.lower()
+    if key in cache:
+        return cache[key]
     try:
         with conn.cursor() as cur:
             # 1) exact (case-insensitive) match
@@ -1119,6 +1363,7 @@ def lookup_category_for_name(conn, name: str) -> Optional[str]:
             )
             row = cur.fetchone()
             if row and row[0]:
+                cache[key] = row[0]
                 return row[0]
 
             # 2) fallback: substring match
@@ -1135,8 +1380,8 @@ def lookup_category_for_name(conn, name: str) -> Optional[str]:
                 (pattern,),
             )
             row2 = cur.fetchone()
-            if row2 and row2[0]:
-                return row2[0]
+            cache[key] = row2[0] if row2 and row2[0] else None
+            return cache[key]
     except Exception:
         logger.exception("lookup_category_for_name failed")
         try:
@@ -1146,41 +1391,252 @@ def lookup_category_for_name(conn, name: str) -> Optional[str]:
     return None
 
 
-def txn_exists(conn, txn_id: Optional[str], utr_no: Optional[str], account_id: Optional[str] = None) -> bool:
-    q_by_both = """
-        SELECT EXISTS (
-            SELECT 1 FROM entries WHERE account_id = %s AND source = %s AND external_id = %s
-        );
+# ----------------------
+# Bulk lookups: one round-trip per lookup kind for a whole statement
+# ----------------------
+def bulk_lookup_accounts_by_name(conn, names: Iterable[str]) -> Optional[Dict[str, Dict]]:
     """
-    q_by_any = "SELECT EXISTS(SELECT 1 FROM entries WHERE source = %s OR external_id = %s);"
+    Batch form of lookup_account_by_name for every distinct `name`; also seeds its memo so
+    later lookup_account_by_name calls for these names need no query.
+    Returns {name.strip().lower(): {"account_id", "account_name"}} for the names that matched,
+    or None if the query failed.
+    """
+    keys = sorted({n.strip().lower() for n in names if n and n.strip()})
+    if not keys:
+        return {}
     try:
         with conn.cursor() as cur:
-            if account_id and txn_id and utr_no:
-                cur.execute(q_by_both, (account_id, txn_id, utr_no))
-                return cur.fetchone()[0]
-            cur.execute(q_by_any, (txn_id, utr_no))
-            return cur.fetchone()[0]
-    except psycopg2.errors.InFailedSqlTransaction:
+            cur.execute(
+                "SELECT lower(locked_attributes->>'account_name'), id, locked_attributes->>'account_name' FROM accounts WHERE lower(locked_attributes->>'account_name') = ANY(%s)",
+                (keys,),
+            )
+            found = {}
+            for key, account_id, account_name in cur.fetchall():
+                found.setdefault(key, {"account_id": account_id, "account_name": account_name or ""})
+            # seed lookup_account_by_name's memo, misses included
+            cache = lookup_cache(conn, "account_by_name")
+            for key in keys:
+                cache[key] = found.get(key)
+            return found
+    except Exception:
+        logger.exception("bulk_lookup_accounts_by_name failed")
         try:
             conn.rollback()
         except Exception:
             pass
-        logger.warning("Connection was in failed transaction state; rolled back. Treating txn as not existing.")
-        return False
+    return None
+
+
+def bulk_lookup_self_accounts_by_payer(conn, payers: Iterable[str]) -> Optional[Dict[str, Tuple[str, str]]]:
+    """
+    Batch form of lookup_self_account_from_payer: {payer: (account_id, account_name)}.
+    Seeds that helper's memo; returns None if the query failed.
+    """
+    keys = sorted({p for p in payers if p})
+    if not keys:
+        return {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT locked_attributes->>'account_number', id, name FROM accounts WHERE locked_attributes->>'account_number' = ANY(%s)",
+                (keys,),
+            )
+            found = {}
+            for payer, account_id, account_name in cur.fetchall():
+                found.setdefault(payer, (account_id, account_name))
+            # seed lookup_self_account_from_payer's memo, misses included
+            cache = lookup_cache(conn, "self_by_payer")
+            for payer in keys:
+                cache[payer] = found.get(payer)
+            return found
     except Exception:
-        logger.exception("Error checking txn existence; treating as not exists")
+        logger.exception("bulk_lookup_self_accounts_by_payer failed")
         try:
             conn.rollback()
         except Exception:
             pass
-        return False
+    return None
+
+
+def bulk_lookup_categories_by_name(conn, names: Iterable[str]) -> Optional[Dict[str, str]]:
+    """
+    Batch form of lookup_category_for_name_from_transactions: {name.lower(): most common category_id}.
+    Step 1 (exact, case-insensitive match) runs for every name in one query, then step 2 (substring
+    match) in one more query for the names step 1 missed. Every name's answer, misses included,
+    is seeded into that helper's memo. Returns None if a query failed.
+    """
+    keys = sorted({n.lower() for n in names if n})
+    if not keys:
+        return {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT DISTINCT ON (lower(e.name)) lower(e.name), t.category_id
+                FROM entries e
+                JOIN transactions t ON e.entryable_id = t.id
+                WHERE lower(e.name) = ANY(%s)
+                  AND t.category_id IS NOT NULL
+                  AND (e.entryable_type ILIKE 'transaction' OR e.entryable_type ILIKE 'transactions' OR e.entryable_type ILIKE 'Transaction' OR e.entryable_type ILIKE 'Transactions')
+                GROUP BY lower(e.name), t.category_id
+                ORDER BY lower(e.name), COUNT(*) DESC
+                """,
+                (keys,),
+            )
+            found = {key: category_id for key, category_id in cur.fetchall()}
+            cache = lookup_cache(conn, "category_from_transactions")
+            # seed hits now: if the substring query below fails, misses keep their per-name fallback
+            cache.update(found)
+
+            missed = [key for key in keys if key not in found]
+            if missed:
+                cur.execute(
+                    """
+                    SELECT DISTINCT ON (k.name) k.name, t.category_id
+                    FROM unnest(%s::text[]) AS k(name)
+                    JOIN entries e ON lower(e.name) LIKE '%%' || trim(k.name) || '%%'
+                    JOIN transactions t ON e.entryable_id = t.id
+                    WHERE t.category_id IS NOT NULL
+                      AND (e.entryable_type ILIKE 'transaction' OR e.entryable_type ILIKE 'transactions' OR e.entryable_type ILIKE 'Transaction' OR e.entryable_type ILIKE 'Transactions')
+                    GROUP BY k.name, t.category_id
+                    ORDER BY k.name, COUNT(*) DESC
+                    """,
+                    (missed,),
+                )
+                found.update({key: category_id for key, category_id in cur.fetchall()})
+                for key in missed:
+                    cache[key] = found.get(key)
+            return found
+    except Exception:
+        logger.exception("bulk_lookup_categories_by_name failed")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+    return None
+
+
+def transfer_source(txn: Dict) -> str:
+    """entries.source of a transfer's outflow entry (the inflow entry adds an _IN suffix)."""
+    return txn.get("transaction_id") or f"PHONEPE-{txn.get('created_at')}"
+
+
+def fetch_existing_transfers(conn, records: List[Dict]) -> Optional[Dict[str, Tuple[int, int]]]:
+    """
+    Return {outflow source: (outflow_transaction_id, inflow_transaction_id)} for the transfers
+    already recorded for the records, in one query; perform_transfer probes this instead of
+    querying per record. Returns None if the query failed.
+    """
+    sources = sorted({transfer_source(r) for r in records})
+    if not sources:
+        return {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT e.source, t.outflow_transaction_id, t.inflow_transaction_id
+                FROM transfers t
+                JOIN entries e ON e.entryable_id = t.outflow_transaction_id
+                WHERE e.source = ANY(%s)
+                """,
+                (sources,),
+            )
+            found = {}
+            for source, out_id, in_id in cur.fetchall():
+                found.setdefault(source, (out_id, in_id))
+            return found
+    except Exception:
+        logger.exception("fetch_existing_transfers failed")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+    return None
+
+
+# insert_transfers' statement: both transactions rows, both entries and the transfers row
+# of every transfer in the VALUES list.
+_TRANSFER_INSERT_SQL = """
+    WITH v (out_id, in_id, created_at, updated_at, date, source_out, source_in, external_id,
+            from_account, to_account, out_amount, in_amount, out_name, in_name) AS (
+        VALUES %s
+    ),
+    tx AS (
+        INSERT INTO transactions (id, created_at, updated_at, kind, external_id)
+        SELECT out_id, created_at, updated_at, 'funds_movement', source_out FROM v
+        UNION ALL
+        SELECT in_id, created_at, updated_at, 'funds_movement', source_in FROM v
+    ),
+    en AS (
+        INSERT INTO entries (
+            account_id, entryable_type, entryable_id, amount, currency, date, name,
+            created_at, updated_at, notes, locked_attributes, external_id, source
+        )
+        SELECT from_account, 'Transaction', out_id, out_amount, 'INR', date, out_name,
+               created_at, updated_at, 'Imported via PhonePe transfer automation', '{}'::jsonb, external_id, source_out
+        FROM v
+        UNION ALL
+        SELECT to_account, 'Transaction', in_id, in_amount, 'INR', date, in_name,
+               created_at, updated_at, 'Imported via PhonePe transfer automation', '{}'::jsonb, external_id, source_in
+        FROM v
+    )
+    INSERT INTO transfers (outflow_transaction_id, inflow_transaction_id, status, created_at, updated_at)
+    SELECT out_id, in_id, 'confirmed', created_at, updated_at FROM v
+"""
 
 
-def perform_transfer(conn, txn: Dict, self_account: Tuple[str, str]) -> Tuple[str, Optional[int], Optional[int]]:
+def insert_transfers(conn, transfers: List[Dict]) -> None:
+    """
+    Write queued transfers (built by perform_transfer) with one statement: both transactions
+    rows, both entries and the transfers row of every transfer, as data-modifying CTEs over one
+    VALUES list. The ids were generated when the transfer was queued, so nothing waits on
+    RETURNING. Commits nothing; raises on failure.
+    """
+    with conn.cursor() as cur:
+        psycopg2.extras.execute_values(
+            cur,
+            _TRANSFER_INSERT_SQL,
+            [
+                (
+                    t["out_txn_id"], t["in_txn_id"], t["created_at"], t["updated_at"], t["date"],
+                    t["source_out"], t["source_in"], t["external_id"], t["from_account"], t["to_account"],
+                    t["out_amount"], t["in_amount"], f"Transfer to {t['to_name']}", f"Transfer from {t['from_name']}",
+                )
+                for t in transfers
+            ],
+            template="(%s::uuid, %s::uuid, %s::timestamp, %s::timestamp, %s::date, %s, %s, %s, %s::uuid, %s::uuid, %s::numeric, %s::numeric, %s, %s)",
+            page_size=len(transfers),
+        )
+
+
+def fetch_existing_transfer(cur, source_out: str) -> Optional[Tuple[str, str]]:
+    """(outflow_transaction_id, inflow_transaction_id) of the transfer recorded for source_out, or None."""
+    cur.execute(
+        """
+        SELECT outflow_transaction_id, inflow_transaction_id
+        FROM transfers
+        WHERE outflow_transaction_id IN (
+            SELECT entryable_id FROM entries WHERE source = %s
+        );
+        """,
+        (source_out,),
+    )
+    return cur.fetchone()
+
+
+def perform_transfer(conn, txn: Dict, self_account: Tuple[str, str],
+                     transfer_map: Optional[Dict[str, Tuple[str, str]]],
+                     queue: List[Dict]) -> Tuple[str, Optional[str], Optional[str]]:
     """
     Attempt to treat the transaction as an internal transfer by matching the payee name to an
     account stored in accounts.locked_attributes->>'account_name'. Uses self_account_id as the 'from' account.
-    Returns ("created"/"exists"/"skip"/"error", outflow_txn_id, inflow_txn_id)
+    Returns ("queued"/"exists"/"skip"/"error", outflow_txn_id, inflow_txn_id)
+
+    New transfers are appended to `queue` ("queued") for flush_transfer_batch to write together.
+    transfer_map is fetch_existing_transfers' result: it answers the "already recorded?" check
+    without a query, and queued transfers are added to it. When it is None (the prefetch
+    failed) the database is asked instead, and a transfer already waiting in the queue counts
+    as existing.
     """
     name = (txn.get("name") or "").strip()
     type = (txn.get("type") or "Debit").strip().lower()
@@ -1190,7 +1646,8 @@ def perform_transfer(conn, txn: Dict, self_account: Tuple[str, str]) -> Tuple[st
 
     to_account = matched["account_id"]
     to_name = matched["account_name"]
-    from_account = self_account[0] or os.getenv("SURE_SELF_ACCOUNT_ID") or DEFAULT_SELF_ACCOUNT_ID
+    # DEFAULT_SELF_ACCOUNT_ID already honours SURE_SELF_ACCOUNT_ID (read once at import)
+    from_account = self_account[0] or DEFAULT_SELF_ACCOUNT_ID
     from_name = self_account[1]
 
     amt = safe_decimal(txn.get("amount"))
@@ -1208,104 +1665,374 @@ def perform_transfer(conn, txn: Dict, self_account: Tuple[str, str]) -> Tuple[st
         # out_amount = amt
         # in_amount = -amt
 
-    source_out = txn.get("transaction_id") or f"PHONEPE-{txn.get('created_at')}"
-    source_in = f"{source_out}_IN"
-    external_id = txn.get("utr_no")
+    source_out = transfer_source(txn)
+
+    if transfer_map is not None and source_out in transfer_map:
+        return ("exists",) + transfer_map[source_out]
+
+    transfer = {
+        "txn": txn,
+        "self_account": self_account,
+        "out_txn_id": str(uuid.uuid4()),
+        "in_txn_id": str(uuid.uuid4()),
+        "created_at": txn["created_at"],
+        "updated_at": txn["updated_at"],
+        "date": txn["date"],
+        "source_out": source_out,
+        "source_in": f"{source_out}_IN",
+        "external_id": txn.get("utr_no"),
+        "from_account": from_account,
+        "from_name": from_name,
+        "to_account": to_account,
+        "to_name": to_name,
+        "out_amount": out_amount,
+        "in_amount": in_amount,
+    }
+    ids = (transfer["out_txn_id"], transfer["in_txn_id"])
 
+    if transfer_map is None:
+        # no prefetched map to probe: ask the database, and the queue for repeats not yet written
+        try:
+            with conn.cursor() as cur:
+                row = fetch_existing_transfer(cur, source_out)
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            logger.exception("perform_transfer failed: %s", e)
+            return ("error", str(e), None)
+        if row:
+            return ("exists", row[0], row[1])
+        for queued in queue:
+            if queued["source_out"] == source_out:
+                return ("exists", queued["out_txn_id"], queued["in_txn_id"])
+    queue.append(transfer)
+    if transfer_map is not None:
+        transfer_map[source_out] = ids
+    return ("queued",) + ids
+
+
+def flush_transfer_batch(conn, queue: List[Dict]) -> List[Dict]:
+    """
+    Write transfers queued by perform_transfer with insert_transfers and commit.
+    If the batch fails it is rolled back and retried transfer by transfer.
+    Returns the transfers that could not be written.
+    """
+    if not queue:
+        return []
+    try:
+        insert_transfers(conn, queue)
+        conn.commit()
+        return []
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        if len(queue) == 1:
+            logger.exception("perform_transfer failed for source=%s", queue[0]["source_out"])
+            return queue
+        logger.exception("Failed to insert batch of %d transfers, retrying one by one", len(queue))
+        failed = []
+        for t in queue:
+            failed.extend(flush_transfer_batch(conn, [t]))
+        return failed
+
+
+def fetch_existing_entry_keys(conn, records: List[Dict]) -> Set[Tuple[str, str, str]]:
+    """
+    Return the (account_id, source, external_id) keys already present in entries for the
+    records' transaction_id/utr_no pairs, in one query. This is the same key the entries
+    ON CONFLICT clause guards, so rows found here can be skipped before any other work.
+    On failure an empty set is returned and ON CONFLICT remains the safety net.
+    """
+    sources = sorted({r["transaction_id"] for r in records if r.get("transaction_id") and r.get("utr_no")})
+    utrs = sorted({r["utr_no"] for r in records if r.get("transaction_id") and r.get("utr_no")})
+    if not sources:
+        return set()
     try:
         with conn.cursor() as cur:
             cur.execute(
-                """
-                SELECT outflow_transaction_id, inflow_transaction_id
-                FROM transfers
-                WHERE outflow_transaction_id IN (
-                    SELECT entryable_id FROM entries WHERE source = %s
-                );
-                """,
-                (source_out,),
+                "SELECT account_id, source, external_id FROM entries WHERE source = ANY(%s) AND external_id = ANY(%s)",
+                (sources, utrs),
             )
-            row = cur.fetchone()
-            if row:
-                conn.commit()
-                return ("exists", row[0], row[1])
+            return {(str(a), s, e) for a, s, e in cur.fetchall()}
+    except Exception:
+        logger.exception("fetch_existing_entry_keys failed")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+    return set()
 
-            cur.execute("BEGIN;")
 
-            cur.execute(
-                "INSERT INTO transactions (created_at, updated_at, kind, external_id) VALUES (%s, %s, 'funds_movement', %s) RETURNING id",
-                (txn["created_at"], txn["updated_at"], source_out),
-            )
-            out_txn_id = cur.fetchone()[0]
+@lru_cache(maxsize=256)
+def _locked_attributes_json(items: Tuple[Tuple[str, str], ...]) -> str:
+    """JSON for a locked_attributes dict given as its items; a statement only has a few distinct ones."""
+    return json.dumps(dict(items))
 
-            cur.execute(
-                """
-                INSERT INTO entries (
-                    account_id, entryable_type, entryable_id, amount, currency, date, name,
-                    created_at, updated_at, notes, locked_attributes, external_id, source
-                ) VALUES (%s, 'Transaction', %s, %s, 'INR', %s, %s, %s, %s, %s, '{}'::jsonb, %s, %s)
-                RETURNING id
-                """,
-                (
-                    from_account,
-                    out_txn_id,
-                    out_amount,
-                    txn["date"],
-                    f"Transfer to {to_name}",
-                    txn["created_at"],
-                    txn["updated_at"],
-                    "Imported via PhonePe transfer automation",
-                    external_id,
-                    source_out,
-                ),
-            )
 
-            cur.execute(
-                "INSERT INTO transactions (created_at, updated_at, kind, external_id) VALUES (%s, %s, 'funds_movement', %s) RETURNING id",
-                (txn["created_at"], txn["updated_at"], source_in),
-            )
-            in_txn_id = cur.fetchone()[0]
+def _copy_csv_value(v) -> str:
+    """One COPY ... (FORMAT csv, NULL '\\N') field; None is the NULL marker."""
+    return "\\N" if v is None else str(v)
 
-            cur.execute(
-                """
-                INSERT INTO entries (
-                    account_id, entryable_type, entryable_id, amount, currency, date, name,
-                    created_at, updated_at, notes, locked_attributes, external_id, source
-                ) VALUES (%s, 'Transaction', %s, %s, 'INR', %s, %s, %s, %s, %s, '{}'::jsonb, %s, %s)
-                RETURNING id
-                """,
-                (
-                    to_account,
-                    in_txn_id,
-                    in_amount,
-                    txn["date"],
-                    f"Transfer from {from_name}",
-                    txn["created_at"],
-                    txn["updated_at"],
-                    "Imported via PhonePe transfer automation",
-                    external_id,
-                    source_in,
-                ),
+
+# flush_expense_batch's session-private staging table; temp tables are not WAL-logged.
+_EXPENSE_STAGE_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS _phonepe_stage (
+        trans_id uuid, created_at timestamp, updated_at timestamp, category_id uuid,
+        locked_attributes jsonb, source text, account_id uuid, amount numeric, date date,
+        name text, notes text, external_id text
+    ) ON COMMIT DELETE ROWS
+"""
+
+# Moves a staged batch into entries and transactions. Module-level so every connection
+# prepares the very same statement text.
+_STAGED_EXPENSE_INSERT_SQL = """
+    WITH en AS (
+        INSERT INTO entries (
+            account_id, entryable_type, entryable_id, amount, currency, date, name,
+            created_at, updated_at, import_id, notes, excluded, plaid_id, locked_attributes, external_id, source
+        )
+        SELECT v.account_id, 'Transaction', v.trans_id, v.amount, 'INR', v.date, v.name,
+               v.created_at, v.updated_at, NULL, v.notes, false, NULL, v.locked_attributes, v.external_id, v.source
+        FROM _phonepe_stage v
+        ON CONFLICT (account_id, source, external_id)
+            WHERE source IS NOT NULL AND external_id IS NOT NULL
+            DO NOTHING
+        RETURNING id, entryable_id
+    ),
+    tx AS (
+        INSERT INTO transactions (id, created_at, updated_at, category_id, merchant_id, locked_attributes, kind, external_id)
+        SELECT v.trans_id, v.created_at, v.updated_at, v.category_id, NULL, v.locked_attributes, 'standard', v.source
+        FROM _phonepe_stage v JOIN en ON en.entryable_id = v.trans_id
+    )
+    SELECT id, entryable_id FROM en
+"""
+
+_EXPENSE_STAGE_COPY_SQL = "COPY _phonepe_stage FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+_EXPENSE_STAGE_READY = weakref.WeakSet()
+
+
+def prepare_expense_stage(conn) -> None:
+    """
+    Once per connection: create the _phonepe_stage temp table used by flush_expense_batch and
+    PREPARE insert_staged_expenses, the statement that moves a staged batch into entries and
+    transactions, so the server parses and plans it once per session instead of once per batch.
+    The table is committed straight away so a rolled-back batch cannot drop it from under the
+    prepared statement (prepared statements themselves survive rollbacks).
+    """
+    if conn in _EXPENSE_STAGE_READY:
+        return
+    with conn.cursor() as cur:
+        cur.execute(_EXPENSE_STAGE_DDL)
+        conn.commit()
+        cur.execute("PREPARE insert_staged_expenses AS " + _STAGED_EXPENSE_INSERT_SQL)
+    _EXPENSE_STAGE_READY.add(conn)
+
+
+def flush_expense_batch(conn, batch: List[Tuple[Dict, Optional[str]]]) -> int:
+    """
+    Insert buffered (row, category_id) expense rows into entries and transactions, then commit.
+    Returns the number of entries inserted.
+
+    The rows are COPYed into the session's temp staging table _phonepe_stage (temp tables are
+    not WAL-logged, and ON COMMIT DELETE ROWS empties it again), and the prepared
+    insert_staged_expenses (see prepare_expense_stage) then moves them into entries and
+    transactions with data-modifying CTEs. The transactions ids are generated here, so the
+    entries insert does not have to wait for RETURNING from the transactions insert.
+
+    Deduplication is left to Postgres: rows whose entry already exists are skipped by ON CONFLICT,
+    which needs a unique index on
+      entries (account_id, source, external_id) WHERE source IS NOT NULL AND external_id IS NOT NULL
+    (Sure's schema; create it by hand on older databases). Only rows whose entry was inserted
+    get a transactions row.
+
+    If the batch fails it is rolled back and retried row by row, so a bad row only loses itself.
+    """
+    if not batch:
+        return 0
+    trans_ids = [str(uuid.uuid4()) for _ in batch]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for (row, category_id), trans_id in zip(batch, trans_ids):
+        writer.writerow([
+            _copy_csv_value(v)
+            for v in (
+                trans_id,
+                row["created_at"],
+                row["updated_at"],
+                category_id,
+                _locked_attributes_json(tuple(row["locked_attributes"].items())),
+                row["source"],
+                row["self_account_id"],
+                row["amount"],
+                row["date"],
+                row["name"],
+                "Added via automation-script",
+                row["external_id"],
             )
+        ])
+    buf.seek(0)
+    try:
+        with conn.cursor() as cur:
+            prepare_expense_stage(conn)
+            cur.copy_expert(_EXPENSE_STAGE_COPY_SQL, buf)
+            cur.execute("EXECUTE insert_staged_expenses")
+            entry_by_trans = {str(trans_id): entry_id for entry_id, trans_id in cur.fetchall()}
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        if len(batch) == 1:
+            logger.exception("Failed to insert expense row: %s", batch[0][0])
+            return 0
+        logger.exception("Failed to insert batch of %d expense rows, retrying row by row", len(batch))
+        return sum(flush_expense_batch(conn, [item]) for item in batch)
+
+    for (row, _), trans_id in zip(batch, trans_ids):
+        if trans_id in entry_by_trans:
+            logger.debug("Inserted expense entry id=%s trans=%s amount=%s account=%s mask=%s", entry_by_trans[trans_id], trans_id, row["amount"], row["self_account_id"], row.get("linked_mobile_number"))
+        else:
+            logger.debug("Already exists, skipping: source=%s external_id=%s account=%s", row["source"], row["external_id"], row["self_account_id"])
+    return len(entry_by_trans)
 
+
+def txn_exists(conn, txn_id: Optional[str], utr_no: Optional[str]) -> bool:
+    """
+    Per-record check for a record with only one of transaction_id/utr_no: does any entry use
+    that source (or external_id)? The entries unique index needs both ids, so ON CONFLICT
+    cannot catch these. Used when fetch_existing_entry_ids could not answer for the statement.
+    """
+    if not txn_id and not utr_no:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT EXISTS(SELECT 1 FROM entries WHERE source = %s OR external_id = %s);", (txn_id, utr_no))
+            return cur.fetchone()[0]
+    except Exception:
+        logger.exception("Error checking txn existence; treating as not exists")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return False
+
+
+def fetch_existing_entry_ids(conn, records: List[Dict]) -> Optional[Tuple[Set[str], Set[str]]]:
+    """
+    For records missing either transaction_id or utr_no (which the entries unique index and
+    fetch_existing_entry_keys cannot cover), return the (sources, external_ids) already used by
+    any entry, in one query. A record is known if its transaction_id is among the sources or its
+    utr_no among the external_ids. Returns None if the query failed (see txn_exists).
+    """
+    partial = [r for r in records if bool(r.get("transaction_id")) != bool(r.get("utr_no"))]
+    sources = sorted({r["transaction_id"] for r in partial if r.get("transaction_id")})
+    utrs = sorted({r["utr_no"] for r in partial if r.get("utr_no")})
+    if not sources and not utrs:
+        return set(), set()
+    try:
+        with conn.cursor() as cur:
             cur.execute(
-                "INSERT INTO transfers (outflow_transaction_id, inflow_transaction_id, status, created_at, updated_at) VALUES (%s, %s, %s, %s, %s)",
-                (out_txn_id, in_txn_id, "confirmed", txn["created_at"], txn["updated_at"]),
+                "SELECT source, external_id FROM entries WHERE source = ANY(%s) OR external_id = ANY(%s)",
+                (sources, utrs),
             )
-
-            cur.execute("COMMIT;")
-            return ("created", out_txn_id, in_txn_id)
-    except Exception as e:
+            rows = cur.fetchall()
+            wanted_sources, wanted_utrs = set(sources), set(utrs)
+            return (
+                {src for src, _ in rows if src in wanted_sources},
+                {ext for _, ext in rows if ext in wanted_utrs},
+            )
+    except Exception:
+        logger.exception("fetch_existing_entry_ids failed")
         try:
             conn.rollback()
         except Exception:
             pass
-        logger.exception("perform_transfer failed: %s", e)
-        return ("error", str(e), None)
+    return None
+
+
+def build_expense_row(r: Dict, self_account_id: str, amt_dec: Decimal) -> Dict:
+    """The expense row (also the dry-run CSV row) for parsed record `r`."""
+    locked_attrs = {}
+    if r.get("linked_mobile_number"):
+        locked_attrs["mobile"] = r.get("linked_mobile_number")
+    locked_attrs["parser_version"] = "phonepe-v3"
+
+    return {
+        "created_at": r["created_at"],
+        "updated_at": r["updated_at"],
+        "date": r["date"],
+        "name": r.get("name") or "PhonePe",
+        "amount": abs(amt_dec),
+        "external_id": r.get("utr_no"),
+        "source": r.get("transaction_id"),
+        "linked_mobile_number": r.get("linked_mobile_number"),
+        "self_account_id": self_account_id,
+        "locked_attributes": locked_attrs,
+    }
+
+
+# dry-run CSV columns: the keys of build_expense_row's rows
+DRY_RUN_FIELDS = (
+    "created_at", "updated_at", "date", "name", "amount", "external_id", "source",
+    "linked_mobile_number", "self_account_id", "locked_attributes",
+)
 
 
 def insert_transactions(conn, records: List[Dict], min_date=None, dry_run=False) -> int:
     inserted = 0
-    dry_rows = []
+    # dry-run rows are written as they are built (the file is opened at the first one)
+    dry_out_path = Path("phonepe_parsed_dryrun.csv")
+    dry_fh = None
+    dry_writer = None
+    dry_count = 0
+    # (row, category_id) expense rows waiting for flush_expense_batch
+    batch: List[Tuple[Dict, Optional[str]]] = []
+    # transfers queued by perform_transfer, waiting for flush_transfer_batch
+    transfers: List[Dict] = []
+
+    # resolve accounts and categories for the whole statement up front (one query per kind);
+    # this fills the lookup helpers' memos, so the per-record calls below are dict hits
+    bulk_lookup_self_accounts_by_payer(conn, (r.get("payer") for r in records))
+    bulk_lookup_accounts_by_name(conn, (r.get("name") for r in records))
+    categories = bulk_lookup_categories_by_name(conn, (r.get("name") or "PhonePe" for r in records))
+    existing_keys = fetch_existing_entry_keys(conn, records)
+    existing_ids = fetch_existing_entry_ids(conn, records)
+    ids_prefetched = existing_ids is not None
+    existing_sources, existing_external_ids = existing_ids if ids_prefetched else (set(), set())
+    transfer_map = fetch_existing_transfers(conn, records)
+    # fallback self account for records whose payer has no account
+    default_self_account_id = os.getenv("SURE_SELF_ACCOUNT_ID") or DEFAULT_SELF_ACCOUNT_ID
+
+    def write_dry_row(row: Dict) -> None:
+        nonlocal dry_fh, dry_writer, dry_count
+        if dry_writer is None:
+            dry_fh = dry_out_path.open("w", newline="", encoding="utf-8")
+            dry_writer = csv.writer(dry_fh)
+            dry_writer.writerow(DRY_RUN_FIELDS)
+        dry_writer.writerow([row[k] for k in DRY_RUN_FIELDS])
+        dry_count += 1
+
+    def flush() -> None:
+        # transfers first, so any that fail can still go in with this expense batch
+        nonlocal inserted, batch, transfers
+        for t in flush_transfer_batch(conn, transfers):
+            logger.error("Transfer error, will try as expense: source=%s", t["source_out"])
+            if transfer_map is not None:
+                transfer_map.pop(t["source_out"], None)
+            row = build_expense_row(t["txn"], t["self_account"][0], safe_decimal(t["txn"].get("amount")))
+            if dry_run:
+                write_dry_row(row)
+                continue
+            batch.append((row, lookup_category_for_name_from_transactions(conn, row["name"], exact=categories is None)))
+        transfers = []
+        inserted += flush_expense_batch(conn, batch)
+        batch = []
 
     try:
         for r in records:
@@ -1324,16 +2051,25 @@ def insert_transactions(conn, records: List[Dict], min_date=None, dry_run=False)
             # Resolve self account by linked_mobile_number (primary) then fallback to env/default
             self_account_id = None
             if r.get("payer"):
-                self_account_id, self_account_name = lookup_self_account_from_payer(conn, r.get("payer"))
+                self_account = lookup_self_account_from_payer(conn, r.get("payer"))
+                if self_account:
+                    self_account_id, self_account_name = self_account
             # if r.get("linked_mobile_number"):
             #     self_account_id, self_account_name = lookup_self_account_by_mobile(conn, r.get("linked_mobile_number"))
             if not self_account_id:
-                self_account_id = os.getenv("SURE_SELF_ACCOUNT_ID") or DEFAULT_SELF_ACCOUNT_ID
+                self_account_id = default_self_account_id
                 self_account_name = "SELF_ACCOUNT"
 
-            exists = txn_exists(conn, r.get("transaction_id"), r.get("utr_no"), self_account_id)
+            entry_key = (str(self_account_id), r.get("transaction_id"), r.get("utr_no"))
+            if r.get("transaction_id") and r.get("utr_no"):
+                exists = entry_key in existing_keys
+            else:
+                # only one id to go on: any entry with that source (or external_id) counts
+                exists = (r.get("transaction_id") in existing_sources) or (r.get("utr_no") in existing_external_ids)
+                if not exists and not ids_prefetched:
+                    exists = txn_exists(conn, r.get("transaction_id"), r.get("utr_no"))
             if exists:
-                logger.info("Already exists, skipping: source=%s external_id=%s account=%s", r.get("transaction_id"), r.get("utr_no"), self_account_id)
+                logger.debug("Already exists, skipping: source=%s external_id=%s account=%s", r.get("transaction_id"), r.get("utr_no"), self_account_id)
                 continue
 
             amt_dec = safe_decimal(r.get("amount"))
@@ -1342,118 +2078,101 @@ def insert_transactions(conn, records: List[Dict], min_date=None, dry_run=False)
                 continue
 
             # Try internal transfer using DB-based account lookup
-            transfer_result = perform_transfer(conn, r, (self_account_id,self_account_name))
-            if transfer_result[0] == "created":
-                logger.info("Inserted transfer for source=%s, amount=%s", r.get("transaction_id"), r.get("amount"))
+            transfer_result = perform_transfer(conn, r, (self_account_id,self_account_name), transfer_map, transfers)
+            if transfer_result[0] == "queued":
+                logger.debug("Queued transfer for source=%s, amount=%s", r.get("transaction_id"), r.get("amount"))
+                if len(transfers) >= EXPENSE_BATCH_SIZE:
+                    flush()
                 continue
             elif transfer_result[0] == "exists":
-                logger.info("Transfer exists for source=%s, amount=%s", r.get("transaction_id"), r.get("amount"))
+                logger.debug("Transfer exists for source=%s, amount=%s", r.get("transaction_id"), r.get("amount"))
                 continue
             elif transfer_result[0] == "error":
                 logger.error("Transfer error, will try as expense: %s", transfer_result[1])
 
             # Normal expense insertion path
-            locked_attrs = {}
-            if r.get("linked_mobile_number"):
-                locked_attrs["mobile"] = r.get("linked_mobile_number")
-            locked_attrs["parser_version"] = "phonepe-v3"
-
-            row = {
-                "created_at": r["created_at"],
-                "updated_at": r["updated_at"],
-                "date": r["date"],
-                "name": r.get("name") or "PhonePe",
-                "amount": abs(amt_dec),
-                "external_id": r.get("utr_no"),
-                "source": r.get("transaction_id"),
-                "linked_mobile_number": r.get("linked_mobile_number"),
-                "self_account_id": self_account_id,
-                "locked_attributes": locked_attrs,
-            }
+            row = build_expense_row(r, self_account_id, amt_dec)
 
             if dry_run:
-                dry_rows.append(row)
+                write_dry_row(row)
                 continue
 
-            try:
-                # with conn.cursor() as cur:
-                #     cur.execute(
-                #         """
-                #         INSERT INTO transactions (created_at, updated_at, category_id, merchant_id, locked_attributes, kind, external_id)
-                #         VALUES (%s, %s, NULL, NULL, %s::jsonb, 'standard', %s)
-                #         RETURNING id
-                #         """,
-                #         (row["created_at"], row["updated_at"], json.dumps(row["locked_attributes"]), row["source"]),
-                #     )
-                #     trans_id = cur.fetchone()[0]
-                #
-
-                # try to inherit category from previous entries with same name
-                with conn.cursor() as cur:
-                    category_id = lookup_category_for_name_from_transactions(conn, row["name"])
-                    cur.execute(
-                        """
-                        INSERT INTO transactions (created_at, updated_at, category_id, merchant_id, locked_attributes, kind, external_id)
-                        VALUES (%s, %s, %s, NULL, %s::jsonb, 'standard', %s)
-                        RETURNING id
-                        """,
-                        (row["created_at"], row["updated_at"], category_id, json.dumps(row["locked_attributes"]), row["source"]),
-                    )
-                    trans_id = cur.fetchone()[0]
-
-                with conn.cursor() as cur:
-
-                    cur.execute(
-                        """
-                        INSERT INTO entries (
-                            account_id, entryable_type, entryable_id, amount, currency, date, name,
-                            created_at, updated_at, import_id, notes, excluded, plaid_id, locked_attributes, external_id, source
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NULL, %s, false, NULL, %s::jsonb, %s, %s)
-                        RETURNING id
-                        """,
-                        (
-                            row["self_account_id"],
-                            "Transaction",
-                            trans_id,
-                            row["amount"],
-                            "INR",
-                            row["date"],
-                            row["name"],
-                            row["created_at"],
-                            row["updated_at"],
-                            "Added via automation-script",
-                            json.dumps(row["locked_attributes"]),
-                            row["external_id"],
-                            row["source"],
-                        ),
-                    )
-                    entry_id = cur.fetchone()[0]
-                    conn.commit()
-                    inserted += 1
-                    logger.info("Inserted expense entry id=%s trans=%s amount=%s account=%s mask=%s", entry_id, trans_id, row["amount"], row["self_account_id"], row.get("linked_mobile_number"))
-            except Exception:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                logger.exception("Failed to insert expense row: %s", row)
-                continue
+            # try to inherit category from previous entries with same name;
+            # after a successful bulk lookup this is a memo hit for every name
+            category_id = lookup_category_for_name_from_transactions(conn, row["name"], exact=categories is None)
+            batch.append((row, category_id))
+            # a statement can list the same transaction twice
+            if r.get("transaction_id") and r.get("utr_no"):
+                existing_keys.add(entry_key)
+            elif r.get("transaction_id"):
+                existing_sources.add(r["transaction_id"])
+            elif r.get("utr_no"):
+                existing_external_ids.add(r["utr_no"])
+            if len(batch) >= EXPENSE_BATCH_SIZE:
+                flush()
+                logger.info("Progress: %d expense rows inserted", inserted)
     except Exception:
         logger.exception("Exception arise")
     finally:
-        pass
+        flush()
+        if dry_fh is not None:
+            dry_fh.close()
 
-    if dry_run and dry_rows:
-        out_path = Path("phonepe_parsed_dryrun.csv")
-        with out_path.open("w", newline="", encoding="utf-8") as fh:
-            writer = csv.DictWriter(fh, fieldnames=list(dry_rows[0].keys()))
-            writer.writeheader()
-            writer.writerows(dry_rows)
-        logger.info("Dry-run CSV written to %s (%d rows)", out_path, len(dry_rows))
+    if dry_count:
+        logger.info("Dry-run CSV written to %s (%d rows)", dry_out_path, dry_count)
 
     logger.info("Done. Inserted %d new expense rows", inserted)
     return inserted
 
+def split_records(records: List[Dict], n_chunks: int) -> List[List[Dict]]:
+    """
+    Partition records into n_chunks lists by transaction id (UTR, then created_at, when missing),
+    keeping statement order within each. A transaction listed twice lands in one chunk, so the
+    per-chunk duplicate checks in insert_transactions still see both copies.
+    """
+    chunks: List[List[Dict]] = [[] for _ in range(n_chunks)]
+    for r in records:
+        key = r.get("transaction_id") or r.get("utr_no") or r.get("created_at") or ""
+        chunks[hash(key) % n_chunks].append(r)
+    return [c for c in chunks if c]
+
+
+def insert_transactions_parallel(pool, records: List[Dict], n_workers: int, min_date=None) -> Tuple[int, List[Dict]]:
+    """
+    Run insert_transactions over chunks of `records` in worker threads, each on its own
+    connection from `pool`. The inserts wait on round-trips, so threads overlap them well.
+    Returns (expense rows inserted, records of the chunks that failed). A chunk fails when it
+    gets no connection (e.g. the server is at max_connections) or its import raises; its
+    records can be imported again, since insert_transactions skips what already exists.
+    """
+    n_chunks = min(n_workers, -(-len(records) // INSERT_CHUNK_SIZE))
+    chunks = split_records(records, n_chunks)
+
+    def insert_chunk(chunk: List[Dict]) -> Optional[int]:
+        try:
+            conn = pool.getconn()
+        except Exception:
+            logger.exception("No pooled connection for a chunk of %d records", len(chunk))
+            return None
+        try:
+            return insert_transactions(conn, chunk, min_date=min_date)
+        except Exception:
+            logger.exception("Import of a chunk of %d records failed", len(chunk))
+            return None
+        finally:
+            pool.putconn(conn)
+
+    inserted = 0
+    failed: List[Dict] = []
+    with ThreadPoolExecutor(max_workers=len(chunks)) as ex:
+        for chunk, n in zip(chunks, ex.map(insert_chunk, chunks)):
+            if n is None:
+                failed.extend(chunk)
+            else:
+                inserted += n
+    return inserted, failed
+
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: python phonepe_expense_update_with_masks_v3.py input.pdf|input.txt [--min-date=YYYY-MM-DD] [--dry-run]")
@@ -1478,20 +2197,13 @@ def main():
     parsed: List[Dict] = []
 
     if inp.suffix.lower() == ".pdf":
-        pdf_to_parse = decrypt_pdf_if_needed(inp)
-        # masks = extract_masked_mobiles_from_pdf(pdf_to_parse)
-        masks = extract_mobiles_from_pdf(pdf_to_parse)
+        pdf_bytes = decrypt_pdf_if_needed(inp)
+        first_page_text = read_first_page_text(pdf_bytes)
+        # masks = extract_masked_mobiles_from_pdf(first_page_text)
+        masks = extract_mobiles_from_pdf(first_page_text)
         logger.info("Found masked mobiles on page1: %s", masks)
 
-        tmp = Path(tempfile.NamedTemporaryFile(delete=False, suffix=".txt").name)
-        try:
-            run_pdf2txt(pdf_to_parse, tmp)
-            parsed = parse_txt_file(tmp)
-        finally:
-            try:
-                tmp.unlink(missing_ok=True)
-            except Exception:
-                pass
+        parsed = parse_lines(extract_pdf_lines(pdf_bytes))
     else:
         parsed = parse_txt_file(inp)
         try:
@@ -1500,21 +2212,34 @@ def main():
             head = "".join(head_lines)
         except Exception:
             head = ""
-        masks = re.findall(r"\+\s*(?:X|x|\d|[\s-]){6,}\d{2,4}", head)
-        masks = [re.sub(r"[ \-]", "", m) for m in masks]
-        masks = [re.sub(r"x", "X", f, flags=re.IGNORECASE) for f in masks]
+        masks = normalize_masks(_TXT_MASKED_MOBILE_RE.findall(head))
 
     # attach linked_mobile_number metadata to records
     default_mask = masks[0] if len(masks) == 1 else None
+    # find_mask_in_text compiles its patterns once per (hashable) mask set
+    mask_set = tuple(masks)
     for rec in parsed:
         if default_mask:
             rec["linked_mobile_number"] = default_mask
         else:
             block_text = " ".join([str(rec.get(k) or "") for k in ("name", "transaction_id", "utr_no")])
-            rec["linked_mobile_number"] = find_mask_in_text(block_text, masks)
+            rec["linked_mobile_number"] = find_mask_in_text(block_text, mask_set)
 
     logger.info("Parsed %d records and attached linked_mobile_number metadata", len(parsed))
 
+    if not dry_run and DB_WORKERS > 1 and len(parsed) > INSERT_CHUNK_SIZE:
+        pool = connect_pool(DB_WORKERS)
+        if pool:
+            try:
+                inserted, parsed = insert_transactions_parallel(pool, parsed, DB_WORKERS, min_date=min_date)
+                logger.info("Inserted %d rows", inserted)
+            finally:
+                pool.closeall()
+            if not parsed:
+                return
+            # chunks that got no connection or failed: one more go on a single connection
+            logger.warning("Retrying %d records from failed chunks on a single connection", len(parsed))
+
     conn = connect_to_postgres()
     if not conn:
         logger.error("DB connection failed; abort")